@@ -0,0 +1,42 @@
+"""
+Compare two benchmark result files.
+
+    uv run python benchmarks/compare.py baseline.json results.json
+"""
+import argparse
+import json
+
+
+def iter_summaries(results, prefix=()):
+    for key, value in results.items():
+        if key == "metadata":
+            continue
+        if isinstance(value, dict) and "mean_ms" in value:
+            yield prefix + (key,), value
+        elif isinstance(value, dict):
+            yield from iter_summaries(value, prefix + (key,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("results")
+    parser.add_argument("--metric", default="mean_ms", choices=("mean_ms", "p50_ms", "p99_ms", "max_ms"))
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = dict(iter_summaries(json.load(f)))
+    with open(args.results) as f:
+        results = dict(iter_summaries(json.load(f)))
+
+    print(f"{'':<32} {'baseline':>10} {'results':>10} {'change':>8}  ({args.metric})")
+    for key, summary in results.items():
+        if key not in baseline:
+            continue
+        before, after = baseline[key][args.metric], summary[args.metric]
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"{' / '.join(key):<32} {before:>10.3f} {after:>10.3f} {change:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Synthetic level maps, in the format of `static/level_maps.json`, for scaling tests.
+
+    uv run python benchmarks/generator.py --width 1000 --height 200 --levels 3 --output big_maps.json
+"""
+import argparse
+import json
+import random
+
+WALL = ord("#")
+EMPTY = ord(".")
+
+# tile: weight
+ENTITY_TILES = {
+    "o": 40,
+    "m": 15,
+    "M": 5,
+    "+": 10,
+    "=": 10,
+    "|": 10,
+    "v": 10,
+}
+MONSTER_TILES = ("m", "M")
+
+
+def generate_level_map(width, height, wall_density=0.1, entity_density=0.02, seed=None):
+    """
+    Generate a level map enclosed by walls, with platforms made of wall runs.
+    Densities are fractions of the inner tiles; monsters are only put on top of a platform.
+    """
+    if width < 8 or height < 6:
+        raise ValueError("A level map should be at least 8x6 tiles")
+
+    rng = random.Random(seed)
+    rows = [bytearray(b"." * width) for _ in range(height)]
+    rows[0][:] = rows[-1][:] = b"#" * width
+    for row in rows:
+        row[0] = row[-1] = WALL
+
+    inner_tiles = (width - 2) * (height - 2)
+
+    walls_left = int(inner_tiles * wall_density)
+    while walls_left > 0:
+        length = min(rng.randint(3, 12), width - 3)
+        i = rng.randrange(2, height - 1)
+        j = rng.randrange(1, width - length)
+        rows[i][j:j + length] = b"#" * length
+        walls_left -= length
+
+    # the player spawns at the bottom left corner, keep some room around it
+    spawn_i, spawn_j = height - 3, 2
+    for i in range(spawn_i - 1, height - 1):
+        rows[i][1:6] = b"....."
+    rows[spawn_i][spawn_j] = ord("@")
+
+    tiles, weights = zip(*ENTITY_TILES.items())
+    entities_left = int(inner_tiles * entity_density)
+    attempts = entities_left * 4
+    while entities_left > 0 and attempts > 0:
+        attempts -= 1
+        i = rng.randrange(1, height - 1)
+        j = rng.randrange(1, width - 1)
+        if rows[i][j] != EMPTY or (i >= spawn_i - 1 and j < 6):
+            continue
+        tile = rng.choices(tiles, weights)[0]
+        if tile in MONSTER_TILES and rows[i + 1][j] != WALL:
+            tile = "o"
+        rows[i][j] = ord(tile)
+        entities_left -= 1
+
+    return [row.decode() for row in rows]
+
+
+def count_tiles(level_map):
+    walls = sum(line.count("#") for line in level_map)
+    entities = sum(line.count(tile) for line in level_map for tile in ENTITY_TILES)
+    return walls, entities
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=500)
+    parser.add_argument("--height", type=int, default=100)
+    parser.add_argument("--wall-density", type=float, default=0.1)
+    parser.add_argument("--entity-density", type=float, default=0.02)
+    parser.add_argument("--levels", type=int, default=1, help="number of level maps to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="a JSON file to write the maps to, stdout by default")
+    args = parser.parse_args()
+
+    level_maps = [
+        generate_level_map(args.width, args.height, args.wall_density, args.entity_density, seed=args.seed + n)
+        for n in range(args.levels)
+    ]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(level_maps, f, indent=2)
+    else:
+        print(json.dumps(level_maps, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Shared helpers for the benchmarks: the game runs headless through the SDL dummy drivers."""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import collections
+import contextlib
+import datetime
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+import pygame
+
+from miniplatform import commands, configs
+
+WINDOW_SIZE = (1280, 720)
+TICK = 1000 / configs.TICK_RATE
+
+
+def setup_display():
+    pygame.init()
+    return pygame.display.set_mode(WINDOW_SIZE)
+
+
+class Timings:
+
+    def __init__(self):
+        self._samples = collections.defaultdict(list)
+
+    @contextlib.contextmanager
+    def measure(self, phase):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._samples[phase].append((time.perf_counter_ns() - start) / 1e6)
+
+    def merge(self, timings):
+        for phase, samples in timings._samples.items():
+            self._samples[phase].extend(samples)
+
+    def summary(self):
+        return {phase: summarize(samples) for phase, samples in self._samples.items()}
+
+
+def summarize(samples):
+    if len(samples) > 1:
+        percentiles = statistics.quantiles(samples, n=100, method="inclusive")
+        p50, p99 = percentiles[49], percentiles[98]
+    else:
+        p50 = p99 = samples[0]
+    return {
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "max_ms": max(samples),
+    }
+
+
+class ScriptedInput:
+    """Pseudo-random but reproducible key presses, a key state source for `commands.InputHandler`."""
+    KEYS = {
+        pygame.K_LEFT: 0.4,
+        pygame.K_RIGHT: 0.5,
+        pygame.K_UP: 0.3,
+        pygame.K_z: 0.05,
+    }
+
+    def __init__(self, seed, hold_frames=20):
+        self._random = random.Random(seed)
+        self._hold_frames = hold_frames
+        self._frame = 0
+        self._pressed = {}
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key):
+        return self._pressed.get(key, False)
+
+    def step(self):
+        if self._frame % self._hold_frames == 0:
+            self._pressed = {key: self._random.random() < chance for key, chance in self.KEYS.items()}
+        self._frame += 1
+
+
+def bind_input(level, get_pressed):
+    return commands.InputHandler((
+        (pygame.K_LEFT, commands.MoveLeftCommand(player=level.player)),
+        (pygame.K_RIGHT, commands.MoveRightCommand(player=level.player)),
+        (pygame.K_UP, commands.JumpCommand(player=level.player)),
+        (pygame.K_z, commands.TimeStopCommand(level=level)),
+    ), get_pressed=get_pressed)
+
+
+def get_metadata(**params):
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "platform": platform.platform(),
+        "params": params,
+    }
+
+
+def print_table(title, rows):
+    """Print phase summaries, `rows` being (name, phase, summary) triplets."""
+    print(title)
+    print(f"{'':<12} {'phase':<12} {'count':>7} {'mean':>9} {'p50':>9} {'p99':>9} {'max':>9}")
+    for name, phase, summary in rows:
+        print(
+            f"{name:<12} {phase:<12} {summary['count']:>7}"
+            f" {summary['mean_ms']:>9.3f} {summary['p50_ms']:>9.3f}"
+            f" {summary['p99_ms']:>9.3f} {summary['max_ms']:>9.3f}"
+        )
+    print("(milliseconds)")
+
+
+def write_results(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
@@ -0,0 +1,99 @@
+"""
+Per-phase frame timings over the shipped levels.
+
+Every map of `static/level_maps.json` is played for a number of frames with scripted inputs,
+timing `Level.reset`, `Level.update`, `Level.redraw` and a full game save: the snapshot `Game.save_game` takes
+on the frame thread, and the packing and the atomic write its saving thread does, into a temporary directory.
+
+    uv run python benchmarks/levels.py --frames 1000 --output results.json
+"""
+import argparse
+import pathlib
+import random
+import tempfile
+
+from harness import TICK, ScriptedInput, Timings, bind_input, get_metadata, print_table, setup_display, write_results
+
+from miniplatform import engine
+from miniplatform.configs import config
+from miniplatform.game import Game
+from miniplatform.levels import Level
+from miniplatform.serializers import write_atomically
+
+PHASES = ("reset", "update", "redraw", "save_game")
+
+
+def run_level(screen, level_maps, number, frames, seed, save_file):
+    random.seed(seed)
+    timings = Timings()
+    keys = ScriptedInput(seed)
+
+    level = Level(level_maps[number], number, is_final=number == len(level_maps) - 1, time_to_reset_factor=Game.INITIAL_TIME)
+    game = Game(level_maps=level_maps, is_autosaving=False)
+    game.level = level
+
+    with timings.measure("reset"):
+        level.reset()
+    input_handler = bind_input(level, keys)
+
+    for _ in range(frames):
+        keys.step()
+        input_handler.handle_input(TICK)
+        with timings.measure("update"):
+            level.update(TICK)
+
+        screen.fill((255, 255, 255))
+        with timings.measure("redraw"):
+            level.redraw(screen)
+
+        with timings.measure("save_game"):
+            write_atomically(save_file, game.pack_binary_records(game.get_binary_records()))
+
+        if not level.is_running:
+            with timings.measure("reset"):
+                level.reset()
+            input_handler = bind_input(level, keys)
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=600, help="frames to play per level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--numpy", action="store_true", help="update the entities with the NumPy engine")
+    parser.add_argument("--levels", type=int, nargs="*", help="level numbers, all of them by default")
+    parser.add_argument("--output", help="a JSON file to write the results to")
+    args = parser.parse_args()
+    if args.numpy and not engine.is_available():
+        parser.error("--numpy needs NumPy, install it with `uv sync --extra numpy`")
+    config.is_batched_update = args.numpy
+
+    screen = setup_display()
+    level_maps = Level.load_level_maps()
+    numbers = args.levels if args.levels else range(len(level_maps))
+
+    total = Timings()
+    results = {"metadata": get_metadata(frames=args.frames, seed=args.seed, numpy=args.numpy), "levels": {}}
+    rows = []
+    with tempfile.TemporaryDirectory() as save_dir:
+        save_file = pathlib.Path(save_dir) / "saved_game.bin"
+        for number in numbers:
+            timings = run_level(screen, level_maps, number, args.frames, seed=args.seed + number, save_file=save_file)
+            summary = timings.summary()
+            results["levels"][str(number)] = summary
+            for phase in PHASES:
+                if phase in summary:
+                    rows.append((f"level {number}", phase, summary[phase]))
+            total.merge(timings)
+
+    results["total"] = total.summary()
+    rows.extend(("total", phase, results["total"][phase]) for phase in PHASES if phase in results["total"])
+    print_table(f"{args.frames} frames per level, {TICK:.2f} ms ticks", rows)
+
+    if args.output:
+        write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
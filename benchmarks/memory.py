@@ -0,0 +1,93 @@
+"""
+Memory per entity, measured with tracemalloc.
+
+Every entity type is allocated in bulk, with and without the sprites rendering creates,
+then a whole generated level is set up to get the bytes per entity the level holds.
+
+    uv run python benchmarks/memory.py --count 100000 --size 1600x200
+"""
+import argparse
+import gc
+import tracemalloc
+
+import pygame
+
+from generator import count_tiles, generate_level_map
+from harness import get_metadata, write_results
+
+from miniplatform.entities import Block, Coin, Lava, Monster, Player
+from miniplatform.levels import Level
+
+FACTORIES = {
+    "player": lambda x, y: Player(pygame.Vector2(x, y)),
+    "lava": lambda x, y: Lava(pygame.Vector2(x, y), direction=pygame.Vector2(1, 0), is_repeatable=False),
+    "coin": lambda x, y: Coin(pygame.Vector2(x, y)),
+    "monster": lambda x, y: Monster(pygame.Vector2(x, y), is_auto_target=True),
+}
+
+
+def measure(build):
+    """Bytes still allocated once `build` returns, along with its result."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        result = build()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return after - before, result
+
+
+def measure_entities(factory, count, with_sprites):
+    def build():
+        entities = [factory(i % 1000 * Block.SIZE, i // 1000 * Block.SIZE) for i in range(count)]
+        if with_sprites:
+            for entity in entities:
+                entity.sprite
+        return entities
+
+    size, _ = measure(build)
+    return size / count
+
+
+def measure_level(level_map):
+    def build():
+        level = Level(level_map, 0)
+        level.reset()
+        return level
+
+    size, _ = measure(build)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000, help="entities to allocate per type")
+    parser.add_argument("--size", default="1600x200", help="generated level size in tiles, WIDTHxHEIGHT")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="a JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = {"metadata": get_metadata(count=args.count, size=args.size, seed=args.seed), "entities": {}}
+    print(f"{'entity':<12} {'bytes':>9} {'with sprite':>12}")
+    for name, factory in FACTORIES.items():
+        size = measure_entities(factory, args.count, with_sprites=False)
+        size_with_sprite = measure_entities(factory, args.count, with_sprites=True)
+        results["entities"][name] = {"bytes": size, "bytes_with_sprite": size_with_sprite}
+        print(f"{name:<12} {size:>9.1f} {size_with_sprite:>12.1f}")
+
+    width, height = (int(value) for value in args.size.lower().split("x"))
+    level_map = generate_level_map(width, height, seed=args.seed)
+    walls, entities = count_tiles(level_map)
+    level_size = measure_level(level_map)
+    results["level"] = {"size": args.size, "walls": walls, "entities": entities, "bytes": level_size}
+    print(f"level {args.size}: {level_size / 1024:.0f} KiB, {level_size / max(entities, 1):.0f} bytes per entity")
+
+    if args.output:
+        write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Automated playtesting: headless bots search for input sequences that complete each level.
+
+A bot holds key combinations for a few frames each, pressing them through `commands.InputHandler`
+like a player would. Every generation plays a batch of rollouts across worker processes:
+the first one random, the next ones mutating the tails of the best sequences so far.
+A level is complete once all its coins are taken and all its monsters are defeated.
+Completion times are reported per level, along with a heatmap of where the bots died or ran out of time.
+
+    uv run python benchmarks/playtest.py --rollouts 1000 --generations 10 --workers 8 --output playtest.json
+"""
+import argparse
+import collections
+import concurrent.futures
+import os
+import random
+import statistics
+import time
+
+import pygame
+from harness import TICK, bind_input, get_metadata, write_results
+
+from miniplatform import compilation
+from miniplatform.entities import Block
+from miniplatform.levels import Level
+from miniplatform.spatial import WALL_TILE
+
+ACTIONS = (
+    (),
+    (pygame.K_RIGHT,),
+    (pygame.K_RIGHT, pygame.K_UP),
+    (pygame.K_LEFT,),
+    (pygame.K_LEFT, pygame.K_UP),
+    (pygame.K_UP,),
+    (pygame.K_z,),
+)
+HEAT = " .:-=+*%@"  # from the fewest failures to the most
+
+
+class BotInput:
+    """Plays an action sequence, every action held for a few frames; a key state source for `InputHandler`."""
+
+    def __init__(self, actions, hold_frames):
+        self._actions = actions
+        self._hold_frames = hold_frames
+        self._frame = 0
+        self._pressed = frozenset()
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key):
+        return key in self._pressed
+
+    def step(self):
+        action_index = self._frame // self._hold_frames
+        if action_index < len(self._actions):
+            self._pressed = frozenset(ACTIONS[self._actions[action_index]])
+        else:
+            self._pressed = frozenset()
+        self._frame += 1
+
+
+def run_rollout(number, actions, seed, hold_frames, max_frames, stall_frames):
+    """Play a level until it's complete, the player dies, the time is up or nothing gets taken for a while."""
+    random.seed(seed)  # coin wobbles and monster directions
+    compiled_levels = compilation.get_compiled_levels()
+    compiled_level = compiled_levels[number]
+    level = Level(
+        compiled_level.level_map, number, is_final=number == len(compiled_levels) - 1, compiled_level=compiled_level,
+    )
+    level.reset()
+    keys = BotInput(actions, hold_frames)
+    input_handler = bind_input(level, keys)
+
+    frame = 0
+    left = len(level.free_coins) + len(level.alive_monsters)
+    last_taken_frame = 0
+    while frame < max_frames and level.player.is_alive and not level.has_win_condition:
+        keys.step()
+        input_handler.handle_input(TICK)
+        level.update(TICK)
+        frame += 1
+        if len(level.free_coins) + len(level.alive_monsters) < left:
+            left = len(level.free_coins) + len(level.alive_monsters)
+            last_taken_frame = frame
+        elif frame - last_taken_frame >= stall_frames:
+            break
+
+    taken = len(level.coins) - len(level.free_coins) + len(level.monsters) - len(level.alive_monsters)
+    x, y = level.player.rect.center
+    return {
+        "level": number,
+        "actions": bytes(actions[:-(-frame // hold_frames)]),
+        "is_complete": level.has_win_condition,
+        "is_dead": not level.player.is_alive,
+        "frames": frame,
+        "taken": taken,  # coins and monsters
+        "cell": (x // Block.SIZE, y // Block.SIZE),
+    }
+
+
+def get_score(result):
+    """Complete and fast first, then whatever cleared more of the level, and survived longer."""
+    frames = result["frames"]
+    return result["is_complete"], result["taken"], -frames if result["is_complete"] else frames
+
+
+def get_candidates(rng, elites, rollouts, sequence_size):
+    if not elites:
+        return [bytes(rng.randrange(len(ACTIONS)) for _ in range(sequence_size)) for _ in range(rollouts)]
+    candidates = []
+    for i in range(rollouts):
+        actions = elites[i % len(elites)]["actions"]
+        cut = rng.randrange(len(actions) + 1)  # keep a prefix, play something else after it
+        tail = bytes(rng.randrange(len(ACTIONS)) for _ in range(sequence_size - cut))
+        candidates.append(actions[:cut] + tail)
+    return candidates
+
+
+def search_level(executor, number, args):
+    rng = random.Random(args.seed + number)
+    sequence_size = -(-args.max_frames // args.hold_frames)
+    elites = []
+    completions = []
+    failures = collections.Counter()
+    rollouts = 0
+    for _ in range(args.generations):
+        candidates = get_candidates(rng, elites, args.rollouts, sequence_size)
+        seeds = [rng.randrange(2 ** 32) for _ in candidates]
+        results = list(executor.map(
+            run_rollout,
+            [number] * len(candidates),
+            candidates,
+            seeds,
+            [args.hold_frames] * len(candidates),
+            [args.max_frames] * len(candidates),
+            [args.stall_frames] * len(candidates),
+            chunksize=max(1, len(candidates) // (args.workers * 4)),
+        ))
+        rollouts += len(results)
+        for result in results:
+            if result["is_complete"]:
+                completions.append(result)
+            else:
+                failures[result["cell"]] += 1
+        elites = sorted([*elites, *results], key=get_score, reverse=True)[:args.elites]
+    return rollouts, elites[0], completions, failures
+
+
+def render_heatmap(level_map, failures):
+    most = max(failures.values(), default=0)
+    rows = []
+    for row, line in enumerate(level_map):
+        cells = []
+        for column, tile in enumerate(line):
+            count = failures.get((column, row), 0)
+            if tile == WALL_TILE:
+                cells.append(WALL_TILE)
+            elif count:
+                cells.append(HEAT[max(1, round(count / most * (len(HEAT) - 1)))])
+            else:
+                cells.append(" ")
+        rows.append("".join(cells).rstrip())
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rollouts", type=int, default=200, help="rollouts per generation and level")
+    parser.add_argument("--generations", type=int, default=5)
+    parser.add_argument("--elites", type=int, default=10, help="best sequences the next generation mutates")
+    parser.add_argument("--hold-frames", type=int, default=10, help="frames every action is held for")
+    parser.add_argument("--max-seconds", type=float, default=90, help="game time a rollout may take")
+    parser.add_argument("--stall-seconds", type=float, default=20, help="game time without taking anything to give up")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--levels", type=int, nargs="*", help="level numbers, all of them by default")
+    parser.add_argument("--heatmaps", action="store_true", help="print the failure heatmaps")
+    parser.add_argument("--output", help="a JSON file to write the results to")
+    args = parser.parse_args()
+    args.max_frames = int(args.max_seconds * 1000 / TICK)
+    args.stall_frames = int(args.stall_seconds * 1000 / TICK)
+
+    level_maps = Level.load_level_maps()
+    numbers = args.levels if args.levels is not None else range(len(level_maps))
+    results = {"metadata": get_metadata(**{k: v for k, v in vars(args).items() if k != "output"}), "levels": {}}
+
+    start = time.perf_counter()
+    total_rollouts = 0
+    print(f"{'level':<6} {'rollouts':>9} {'complete':>9} {'best s':>8} {'median s':>9} {'best taken':>11}")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for number in numbers:
+            rollouts, best, completions, failures = search_level(executor, number, args)
+            total_rollouts += rollouts
+            times = [result["frames"] * TICK / 1000 for result in completions]
+            best_time = f"{min(times):.1f}" if times else "-"
+            median_time = f"{statistics.median(times):.1f}" if times else "-"
+            print(f"{number:<6} {rollouts:>9} {len(completions):>9} {best_time:>8} {median_time:>9} {best['taken']:>11}")
+            heatmap = render_heatmap(level_maps[number], failures)
+            if args.heatmaps:
+                print("\n".join(heatmap))
+            results["levels"][number] = {
+                "rollouts": rollouts,
+                "completions": len(completions),
+                "completion_seconds": times,
+                "best": {**best, "actions": best["actions"].hex(), "cell": list(best["cell"])},
+                "failures": [[column, row, count] for (column, row), count in failures.items()],
+                "heatmap": heatmap,
+            }
+    elapsed = time.perf_counter() - start
+    print(f"{total_rollouts} rollouts in {elapsed:.1f} s, {total_rollouts / elapsed:.1f} per second on {args.workers} workers")
+
+    if args.output:
+        write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
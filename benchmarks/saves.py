@@ -0,0 +1,91 @@
+"""
+JSON against binary saves: size, save and load time.
+
+Every shipped level, and optionally generated maps of growing size, is played for a while,
+then saved and loaded in both formats.
+
+    uv run python benchmarks/saves.py --repeat 50 --sizes 400x100 1600x200 --output saves.json
+"""
+import argparse
+import json
+import random
+
+from generator import generate_level_map
+from harness import TICK, ScriptedInput, Timings, bind_input, get_metadata, print_table, write_results
+
+from miniplatform.game import Game
+from miniplatform.levels import Level
+
+PHASES = ("json_save", "json_load", "binary_save", "binary_load")
+
+
+def play_level(level_maps, number, frames, seed):
+    random.seed(seed)
+    keys = ScriptedInput(seed)
+    game = Game(level_maps=level_maps, is_autosaving=False)
+    game.level = Level(level_maps[number], number, is_final=number == len(level_maps) - 1, time_to_reset_factor=Game.INITIAL_TIME)
+    game.level.reset()
+    input_handler = bind_input(game.level, keys)
+    for _ in range(frames):
+        keys.step()
+        input_handler.handle_input(TICK)
+        game.level.update(TICK)
+        if not game.level.is_running:
+            break
+    return game
+
+
+def run_saves(game, repeat):
+    timings = Timings()
+    for _ in range(repeat):
+        with timings.measure("json_save"):
+            json_data = game.json()
+        with timings.measure("json_load"):
+            Game.to_internal_value(json.loads(json_data))
+        with timings.measure("binary_save"):
+            binary_data = game.to_binary()
+        with timings.measure("binary_load"):
+            Game.from_binary(binary_data, level_maps=game.level_maps)
+    sizes = {"json_bytes": len(json_data.encode()), "binary_bytes": len(binary_data)}
+    return timings, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=300, help="frames to play before saving")
+    parser.add_argument("--repeat", type=int, default=20, help="saves and loads per level")
+    parser.add_argument("--sizes", nargs="*", default=(), help="generated map sizes in tiles, WIDTHxHEIGHT")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="a JSON file to write the results to")
+    args = parser.parse_args()
+
+    cases = []
+    level_maps = Level.load_level_maps()
+    cases.extend((f"level {number}", level_maps, number) for number in range(len(level_maps)))
+    for size in args.sizes:
+        width, height = (int(value) for value in size.lower().split("x"))
+        cases.append((size, [generate_level_map(width, height, seed=args.seed)], 0))
+
+    results = {"metadata": get_metadata(**{k: v for k, v in vars(args).items() if k != "output"}), "levels": {}}
+    rows = []
+    sizes_rows = []
+    for name, maps, number in cases:
+        game = play_level(maps, number, args.frames, args.seed + number)
+        timings, sizes = run_saves(game, args.repeat)
+        summary = timings.summary()
+        results["levels"][name] = {**summary, **sizes}
+        rows.extend((name, phase, summary[phase]) for phase in PHASES)
+        sizes_rows.append((name, sizes))
+
+    print_table(f"{args.repeat} saves and loads per level", rows)
+    print(f"{'':<12} {'json bytes':>12} {'binary bytes':>13} {'ratio':>7}")
+    for name, sizes in sizes_rows:
+        ratio = sizes["json_bytes"] / sizes["binary_bytes"]
+        print(f"{name:<12} {sizes['json_bytes']:>12} {sizes['binary_bytes']:>13} {ratio:>7.1f}")
+
+    if args.output:
+        write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Frame time against entity count, over synthetic maps of growing size.
+
+Times `Level.reset`, `Level.update` and `Level.redraw` on generated maps.
+The first reset spawns the level and isn't timed, the timed resets restore the spawned state.
+The plot needs matplotlib which isn't a dependency of the game.
+
+    uv run python benchmarks/scaling.py --sizes 100x50 400x100 1600x200 --output scaling.json --plot scaling.png
+"""
+import argparse
+import random
+
+from generator import count_tiles, generate_level_map
+from harness import TICK, ScriptedInput, Timings, bind_input, get_metadata, print_table, setup_display, write_results
+
+from miniplatform import engine
+from miniplatform.configs import config
+from miniplatform.game import Game
+from miniplatform.levels import Level
+
+PHASES = ("reset", "update", "redraw")
+DEFAULT_SIZES = ("100x50", "200x100", "400x100", "800x200", "1600x200")
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def run_map(screen, level_map, frames, resets, seed):
+    random.seed(seed)
+    timings = Timings()
+    keys = ScriptedInput(seed)
+    level = Level(level_map, 0, time_to_reset_factor=Game.INITIAL_TIME)
+
+    level.reset()  # the spawn, the restores are what's timed
+    for _ in range(resets):
+        with timings.measure("reset"):
+            level.reset()
+    input_handler = bind_input(level, keys)
+
+    for _ in range(frames):
+        keys.step()
+        input_handler.handle_input(TICK)
+        with timings.measure("update"):
+            level.update(TICK)
+
+        screen.fill((255, 255, 255))
+        with timings.measure("redraw"):
+            level.redraw(screen)
+
+        if not level.is_running:
+            with timings.measure("reset"):
+                level.reset()
+            input_handler = bind_input(level, keys)
+
+    return timings
+
+
+def plot(path, points):
+    try:
+        import matplotlib
+    except ImportError:
+        print("matplotlib is not installed, skipping the plot")
+        return
+    matplotlib.use("Agg")
+    from matplotlib import pyplot
+
+    entity_counts = [point["entities"] for point in points]
+    figure, axes = pyplot.subplots()
+    for phase in PHASES:
+        axes.plot(entity_counts, [point[phase]["mean_ms"] for point in points], marker="o", label=phase)
+    axes.set_xlabel("entities")
+    axes.set_ylabel("mean ms per call")
+    axes.set_xscale("log")
+    axes.legend()
+    figure.savefig(path)
+    print(f"Plot saved to {path}")
+
+
+def print_chart(points):
+    """A rough text plot of the update and redraw time for each map."""
+    longest = max(point[phase]["mean_ms"] for point in points for phase in ("update", "redraw")) or 1
+    for point in points:
+        for phase in ("update", "redraw"):
+            mean = point[phase]["mean_ms"]
+            bar = "#" * max(1, round(40 * mean / longest))
+            print(f"{point['entities']:>8} {phase:<7} {bar} {mean:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="*", default=DEFAULT_SIZES, help="map sizes in tiles, WIDTHxHEIGHT")
+    parser.add_argument("--wall-density", type=float, default=0.1)
+    parser.add_argument("--entity-density", type=float, default=0.02)
+    parser.add_argument("--frames", type=int, default=200, help="frames to play per map")
+    parser.add_argument("--resets", type=int, default=3, help="timed resets per map, after the spawn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--numpy", action="store_true", help="update the entities with the NumPy engine")
+    parser.add_argument("--output", help="a JSON file to write the results to")
+    parser.add_argument("--plot", help="an image file to plot the results to")
+    args = parser.parse_args()
+    if args.numpy and not engine.is_available():
+        parser.error("--numpy needs NumPy, install it with `uv sync --extra numpy`")
+    config.is_batched_update = args.numpy
+
+    screen = setup_display()
+    points = []
+    rows = []
+    for size in args.sizes:
+        width, height = parse_size(size)
+        level_map = generate_level_map(width, height, args.wall_density, args.entity_density, seed=args.seed)
+        walls, entities = count_tiles(level_map)
+        summary = run_map(screen, level_map, args.frames, args.resets, args.seed).summary()
+        points.append({"size": size, "tiles": width * height, "walls": walls, "entities": entities, **summary})
+        rows.extend((f"{entities} ent.", phase, summary[phase]) for phase in PHASES)
+
+    print_table(f"{args.frames} frames per map, {TICK:.2f} ms ticks", rows)
+    print_chart(points)
+
+    if args.output:
+        params = {key: value for key, value in vars(args).items() if key not in ("output", "plot")}
+        write_results(args.output, {"metadata": get_metadata(**params), "points": points})
+    if args.plot:
+        plot(args.plot, points)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,11 @@ import pygame
 import logging
 import os
 
-from miniplatform import configs, effects
-from miniplatform.game import Game
+from miniplatform import configs, effects, engine
+from miniplatform.assets import assets
+from miniplatform.profiling import profiler
+from miniplatform.rendering import DirtyRectsRenderer
+from miniplatform.startup import StartupPipeline
 
 
 def main():
@@ -12,22 +15,46 @@ def main():
     if not configs.VAR_DIR.exists():
         configs.VAR_DIR.mkdir()
 
-    pygame.init()
+    startup = StartupPipeline()
+    with startup.stage("init"):
+        pygame.init()
 
     video_info = pygame.display.Info()
-    screen = pygame.display.set_mode((video_info.current_w, video_info.current_h))
-    pygame.display.set_caption("Mini platform")
+    screen = startup.show_window((video_info.current_w, video_info.current_h))
 
     clock = pygame.time.Clock()
 
+    background = (255, 255, 255)
+    renderer = DirtyRectsRenderer(background) if os.getenv("MINI_PLATFORM_DIRTY_RECTS") == "1" else None
+
+    if os.getenv("MINI_PLATFORM_NUMPY") == "1":
+        if engine.is_available():
+            configs.config.is_batched_update = True
+        else:
+            logging.warning("NumPy isn't installed (`uv sync --extra numpy`), entities are updated one by one")
+
     logging.info("Starting game session")
 
-    game_session = Game.load_game()
-    game_session.dispatch_session()
-    effects.play_soundtrack()
+    startup.start_loading()
+    while not startup.wait_for_loading(timeout=1 / configs.FPS):  # the window stays responsive meanwhile
+        if any(event.type == pygame.QUIT for event in pygame.event.get()):
+            logging.info("Stopping game session (quit while loading)")
+            return
+    game_session = startup.get_game(is_journaling=os.getenv("MINI_PLATFORM_SAVE_JOURNAL") == "1")
+    with startup.stage("session"):
+        game_session.dispatch_session()
+    is_soundtrack_pending = True  # until the music is loaded, the game doesn't wait for it
 
     is_running = True
+    tick = 1000 / configs.TICK_RATE
+    accumulated_time = 0
+    clock.tick()  # the loading time isn't simulated
+
     while is_running:
+        if is_soundtrack_pending and not assets.is_loading():
+            effects.play_soundtrack()
+            is_soundtrack_pending = False
+
         frame = clock.tick(configs.FPS)
 
         for event in pygame.event.get():
@@ -35,13 +62,35 @@ def main():
                 is_running = False
                 logging.info("Stopping game session (quit event)")
                 game_session.stop_saving_game()
-
-        game_session.update_state(frame)
-
-        screen.fill((255, 255, 255))
-        game_session.render(screen)
-
-        pygame.display.flip()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                profiler.start_capture()
+
+        # the simulation advances in fixed steps, independently of the display frame rate
+        accumulated_time += frame
+        ticks = 0
+        while accumulated_time >= tick:
+            if ticks == configs.MAX_TICKS_PER_FRAME:
+                logging.debug("Dropping %s ms of simulation time", accumulated_time - accumulated_time % tick)
+                accumulated_time %= tick
+                break
+            game_session.update_state(tick)
+            accumulated_time -= tick
+            ticks += 1
+        configs.config.interpolation = accumulated_time / tick
+
+        if renderer:
+            renderer.render(screen, game_session)
+        else:
+            screen.fill(background)
+            game_session.render(screen)
+            with profiler.measure("flip"):
+                pygame.display.flip()
+        profiler.end_frame()
+        if startup:
+            startup.report()
+            startup = None
 
 
 def setup_logging():
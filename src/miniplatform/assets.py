@@ -0,0 +1,97 @@
+import functools
+import io
+import logging
+import threading
+import time
+
+import pygame
+
+
+class AssetManager:
+    """
+    Sounds and music are read in a background thread at startup, so no asset is loaded from disk within a frame.
+    An asset asked for before it's loaded is skipped rather than waited for.
+    Fonts and full screen surfaces are pooled, they're shared by every level.
+    """
+
+    def __init__(self):
+        self._sounds = {}
+        self._music = {}  # the encoded files, they're decoded while streaming
+        self._playing_music = None  # the music stream reads from it
+        self._surfaces = {}
+        self._loading_thread = None
+        self.loading_time = None  # ms, once the preloading is done
+
+    def preload(self, sound_paths, music_paths):
+        self._loading_thread = threading.Thread(
+            target=self._load,
+            args=(tuple(sound_paths), tuple(music_paths)),
+            name="AssetLoader",
+            daemon=True,
+        )
+        self._loading_thread.start()
+
+    def _load(self, sound_paths, music_paths):
+        start = time.perf_counter()
+        for path in sound_paths:
+            self._sounds[path] = self._read_sound(path)
+        for path in music_paths:
+            self._music[path] = self._read_music(path)
+        logging.info(
+            "Loaded %s sounds and %s music files",
+            sum(self._sounds[path] is not None for path in sound_paths),
+            sum(self._music[path] is not None for path in music_paths),
+        )
+        self.loading_time = (time.perf_counter() - start) * 1000
+
+    def is_loading(self):
+        return self._loading_thread is not None and self._loading_thread.is_alive()
+
+    def get_sound(self, path):
+        """A loaded sound, None while it's loading or if it can't be loaded."""
+        return self._sounds.get(path)
+
+    def load_music(self, path):
+        """Put the music into the mixer from memory, returns whether there's any to play yet."""
+        data = self._music.get(path)
+        if data is None:
+            return False
+        self._playing_music = io.BytesIO(data)
+        pygame.mixer.music.load(self._playing_music, namehint=path.suffix[1:])
+        return True
+
+    @staticmethod
+    @functools.cache
+    def get_font(size):
+        return pygame.font.Font(None, size)
+
+    def get_surface(self, name, size, format_surface):
+        """A surface reused for as long as its size and the pixel format don't change."""
+        surface = self._surfaces.get(name)
+        if (
+            surface is None
+            or surface.get_size() != size
+            or surface.get_bitsize() != format_surface.get_bitsize()
+        ):
+            surface = pygame.Surface(size, 0, format_surface)
+            self._surfaces[name] = surface
+        return surface
+
+    @staticmethod
+    def _read_sound(path):
+        try:
+            return pygame.mixer.Sound(str(path))
+        except (pygame.error, FileNotFoundError) as e:
+            logging.warning("Can't load the sound %s: %s", path.name, e)
+            return None
+
+    @staticmethod
+    def _read_music(path):
+        try:
+            return path.read_bytes()
+        except OSError as e:
+            logging.warning("Can't load the music %s: %s", path.name, e)
+            return None
+
+
+assets = AssetManager()
@@ -5,14 +5,16 @@ import pygame
 
 class InputHandler:
 
-    def __init__(self, commands=None):
+    def __init__(self, commands=None, get_pressed=None):
         commands = commands or ()
         self._commands_registry = {
             key: command for key, command in commands
         }
+        # a headless session may provide its own key state instead of the keyboard
+        self._get_pressed = get_pressed or pygame.key.get_pressed
 
     def handle_input(self, time):
-        keys = pygame.key.get_pressed()
+        keys = self._get_pressed()
         for key, command in self._commands_registry.items():
             if keys[key]:
                 command.execute(time)
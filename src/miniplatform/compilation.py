@@ -0,0 +1,191 @@
+import collections.abc
+import concurrent.futures
+import functools
+import hashlib
+import json
+import logging
+import re
+import struct
+
+from miniplatform.configs import STATIC_DIR, VAR_DIR
+from miniplatform.serializers import write_atomically
+from miniplatform.spatial import parse_walls
+
+PLAYER_TILE = "@"
+_SPAWN_TILES = re.compile(r"[+v|=omM@]")  # lava, coins, monsters and the player
+
+CACHE_MAGIC = b"MPLC"
+CACHE_FORMAT_VERSION = 1
+# magic, version, levels number:
+CACHE_HEADER = struct.Struct("<4sHI")
+# rows, columns, level map text size, spawns number, has a player, player column and row:
+LEVEL_HEADER = struct.Struct("<IIII?II")
+SPAWN_RECORD = struct.Struct("<cII")  # tile, column, row
+
+PARALLEL_COMPILE_TILES = 1_000_000  # below that, starting the worker processes takes longer than compiling
+
+
+class CompiledLevel:
+    """
+    A level map parsed once: the wall flags, the entity spawns in the map order and the player spawn.
+    Levels are reset from it, instead of walking the map text tile by tile.
+    """
+
+    def __init__(self, level_map, rows, columns, walls, spawns, player_spawn):
+        self.level_map = level_map
+        self.rows = rows
+        self.columns = columns
+        self.walls = walls  # a byte per tile, row by row
+        self.spawns = spawns  # (tile, column, row)
+        self.player_spawn = player_spawn  # (column, row), the last one on the map counts
+
+    def pack(self):
+        text = "\n".join(self.level_map).encode()
+        has_player = self.player_spawn is not None
+        player_column, player_row = self.player_spawn if has_player else (0, 0)
+        header = LEVEL_HEADER.pack(
+            self.rows, self.columns, len(text), len(self.spawns), has_player, player_column, player_row,
+        )
+        spawns = b"".join(SPAWN_RECORD.pack(tile.encode(), column, row) for tile, column, row in self.spawns)
+        return header + text + spawns + self.walls
+
+    @classmethod
+    def unpack_from(cls, data, offset=0):
+        """Read a level packed at the offset, return it along with the offset of what follows."""
+        rows, columns, text_size, spawns_number, has_player, player_column, player_row = LEVEL_HEADER.unpack_from(
+            data, offset,
+        )
+        offset += LEVEL_HEADER.size
+        text = bytes(data[offset:offset + text_size]).decode()
+        level_map = text.split("\n") if rows else []
+        offset += text_size
+        spawns_size = spawns_number * SPAWN_RECORD.size
+        spawns = tuple(
+            (tile.decode(), column, row)
+            for tile, column, row in SPAWN_RECORD.iter_unpack(data[offset:offset + spawns_size])
+        )
+        offset += spawns_size
+        walls = bytes(data[offset:offset + rows * columns])
+        offset += rows * columns
+        if len(level_map) != rows or len(walls) != rows * columns:
+            raise struct.error("The compiled level is cut short")
+        player_spawn = (player_column, player_row) if has_player else None
+        return cls(level_map, rows, columns, walls, spawns, player_spawn), offset
+
+
+def compile_level(level_map):
+    walls, rows, columns = parse_walls(level_map)
+    spawns = []
+    player_spawn = None
+    for row, line in enumerate(level_map):
+        for match in _SPAWN_TILES.finditer(line):
+            tile, column = match.group(), match.start()
+            if tile == PLAYER_TILE:
+                player_spawn = (column, row)
+            else:
+                spawns.append((tile, column, row))
+    return CompiledLevel(level_map, rows, columns, walls, tuple(spawns), player_spawn)
+
+
+def compile_levels(level_maps, is_parallel=None):
+    """Compile every level, in worker processes when the maps are large enough to be worth it."""
+    if is_parallel is None:
+        tiles = sum(len(line) for level_map in level_maps for line in level_map)
+        is_parallel = len(level_maps) > 1 and tiles >= PARALLEL_COMPILE_TILES
+    if not is_parallel:
+        return [compile_level(level_map) for level_map in level_maps]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(level_maps)) as executor:
+        return list(executor.map(compile_level, level_maps))
+
+
+def pack_compiled_levels(compiled_levels):
+    header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, len(compiled_levels))
+    return header + b"".join(compiled_level.pack() for compiled_level in compiled_levels)
+
+
+def unpack_compiled_levels(data):
+    data = memoryview(data)
+    magic, version, levels_number = CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_FORMAT_VERSION:
+        raise struct.error("Not a compiled levels cache of this version")
+    offset = CACHE_HEADER.size
+    compiled_levels = []
+    for _ in range(levels_number):
+        compiled_level, offset = CompiledLevel.unpack_from(data, offset)
+        compiled_levels.append(compiled_level)
+    return compiled_levels
+
+
+def get_cache_file(digest):
+    return VAR_DIR / f"level_maps_{digest[:16]}.bin"
+
+
+class CompiledLevels(collections.abc.Sequence):
+    """
+    The compiled levels of a level maps file, read from the cache when it's there.
+    Otherwise every level is compiled when it's first asked for, so a game starts as soon as its level is ready,
+    and `compile_all` compiles the rest and caches them all.
+    """
+
+    def __init__(self, level_maps, cache_file, compiled_levels=()):
+        self.level_maps = level_maps
+        self.cache_file = cache_file
+        self._levels = dict(enumerate(compiled_levels))  # by level number, filled from other threads too
+
+    def __len__(self):
+        return len(self.level_maps)
+
+    def __getitem__(self, number):
+        if isinstance(number, slice):
+            return [self[i] for i in range(len(self))[number]]
+        number = range(len(self))[number]
+        compiled_level = self._levels.get(number)
+        if compiled_level is None:
+            compiled_level = self._levels.setdefault(number, compile_level(self.level_maps[number]))
+        return compiled_level
+
+    def is_complete(self):
+        return len(self._levels) == len(self)
+
+    def compile_all(self):
+        """Compile the levels that haven't been yet, then write the cache."""
+        if self.is_complete():
+            return
+        numbers = [number for number in range(len(self)) if number not in self._levels]
+        for number, compiled_level in zip(numbers, compile_levels([self.level_maps[number] for number in numbers])):
+            self._levels.setdefault(number, compiled_level)
+        try:
+            write_atomically(self.cache_file, pack_compiled_levels(self))
+        except OSError as e:
+            logging.warning("Couldn't cache the compiled levels: %s", e)
+        else:
+            for stale_file in VAR_DIR.glob("level_maps_*.bin"):  # of the earlier versions of the maps
+                if stale_file != self.cache_file:
+                    stale_file.unlink(missing_ok=True)
+            logging.info("Levels compiled to %s", self.cache_file.name)
+
+
+@functools.cache
+def get_compiled_levels():
+    """The shipped levels, loaded once per process."""
+    return load_compiled_levels()
+
+
+def load_compiled_levels(levels_path=None):
+    """
+    Compiled levels of the level maps file, cached under the var directory by the hash of the file contents.
+    When the file has changed since the cache was written, the levels are left to be compiled on demand.
+    """
+    levels_path = levels_path or STATIC_DIR / "level_maps.json"
+    content = levels_path.read_bytes()
+    cache_file = get_cache_file(hashlib.sha256(content).hexdigest())
+    try:
+        compiled_levels = unpack_compiled_levels(cache_file.read_bytes())
+    except FileNotFoundError:
+        pass
+    except (struct.error, UnicodeDecodeError):
+        logging.warning("Compiled levels cache %s is broken, compiling the levels again", cache_file.name)
+    else:
+        level_maps = [compiled_level.level_map for compiled_level in compiled_levels]
+        return CompiledLevels(level_maps, cache_file, compiled_levels)
+    return CompiledLevels(json.loads(content), cache_file)
@@ -2,7 +2,9 @@ import pathlib
 import threading
 
 
-FPS = 60
+FPS = 60  # display frames per second
+TICK_RATE = 60  # simulation steps per second
+MAX_TICKS_PER_FRAME = 5  # catching up on slow frames beyond that gets dropped
 
 ROOT_DIR = pathlib.Path(__file__).parent
 STATIC_DIR = ROOT_DIR / "static"
@@ -12,13 +14,6 @@ config = threading.local()
 config.offset_x = 0
 config.offset_y = 0
 config.color_factor = 1
+config.interpolation = 1  # between the previous and the current simulation state
+config.is_batched_update = False  # moving entities are updated by the NumPy engine
 
-
-def adjust_color(color):
-    factor = config.color_factor
-    if factor == 1:
-        return color
-    return tuple(
-        ((255 - p) * (1 - factor) + p * factor) / 2
-        for p in color
-    )
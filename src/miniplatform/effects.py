@@ -3,8 +3,11 @@ from functools import cached_property
 
 import pygame
 
+from miniplatform.assets import assets
 from miniplatform.configs import STATIC_DIR
 
+MUSIC = ("soundtrack", "ending")
+
 
 class Sound(enum.Enum):
     VICTORY = 1, "victory.wav"
@@ -17,12 +20,17 @@ class Sound(enum.Enum):
 
     def __init__(self, channel_id, filename):
         self._channel_id = channel_id
-        self._sound_path = STATIC_DIR / "sounds" / filename
+        self.sound_path = STATIC_DIR / "sounds" / filename
         self._sound = None
 
     def play(self):
+        if not is_audio_enabled():
+            return
+
         if not self._sound:
-            self._sound = pygame.mixer.Sound(str(self._sound_path))
+            self._sound = assets.get_sound(self.sound_path)
+            if not self._sound:
+                return
 
         if not self.sound_channel.get_busy():
             self.sound_channel.play(self._sound)
@@ -44,7 +52,27 @@ class Sound(enum.Enum):
         return pygame.mixer.Channel(self._channel_id)
 
 
+def preload_audio():
+    """Start reading the sounds and the music in the background."""
+    if is_audio_enabled():
+        assets.preload((sound.sound_path for sound in Sound), (get_music_path(name) for name in MUSIC))
+
+
 def play_soundtrack(name="soundtrack"):
-    soundtrack_path = STATIC_DIR / "music" / f"{name}.ogg"
-    pygame.mixer.music.load(str(soundtrack_path))
-    pygame.mixer.music.play(-1)
+    if not is_audio_enabled():
+        return
+    if assets.load_music(get_music_path(name)):
+        pygame.mixer.music.play(-1)
+
+
+def get_music_path(name):
+    return STATIC_DIR / "music" / f"{name}.ogg"
+
+
+def fadeout_soundtrack(time):
+    if is_audio_enabled():
+        pygame.mixer.music.fadeout(time)
+
+
+def is_audio_enabled():
+    return pygame.mixer.get_init() is not None  # the mixer isn't initialized when running headless
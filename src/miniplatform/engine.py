@@ -0,0 +1,419 @@
+"""
+An optional NumPy engine for the moving entities.
+
+The state of lava, coins and monsters is kept in arrays, one table per entity type,
+and every table is advanced in a single vectorized step. The entities the level holds become thin views
+over a row of their table, so serialization, rendering and the player collisions work as before.
+"""
+import logging
+import math
+
+import pygame
+
+try:
+    import numpy as np
+except ImportError:  # the engine is optional, numpy is the `numpy` extra of the game
+    np = None
+
+from miniplatform.entities import Coin, Lava, Monster
+
+
+def is_available():
+    return np is not None
+
+
+class EntityEngine:
+
+    def __init__(self, entities, walls):
+        self._layout = _WallLayout(walls)
+        self.tables = []
+        self.views = [None] * len(entities)
+        for table_class in (LavaTable, CoinTable, MonsterTable):
+            indexes = [i for i, entity in enumerate(entities) if isinstance(entity, table_class.ENTITY_CLASS)]
+            if not indexes:
+                continue
+            table = table_class([entities[i] for i in indexes])
+            for i, view in zip(indexes, table.views):
+                self.views[i] = view
+            self.tables.append(table)
+        logging.debug("Entity engine set up with %s entities", len(entities))
+
+    def update(self, time, level):
+        for table in self.tables:
+            index, previous_cells = table.step(time, level, self._layout)
+            if not len(index):
+                continue
+            # the spatial index only needs the entities that moved into other cells
+            cells = self._layout.get_cells(table.x[index], table.y[index], table.width, table.height)
+            is_moved = np.zeros(len(index), dtype=bool)
+            for previous, current in zip(previous_cells, cells):
+                is_moved |= previous != current
+            for i in index[is_moved].tolist():
+                level.spatial_index.update(table.views[i])
+
+    def get_state(self):
+        """Copies of every table's arrays."""
+        return [
+            (table, {name: value.copy() for name, value in vars(table).items() if isinstance(value, np.ndarray)})
+            for table in self.tables
+        ]
+
+    @staticmethod
+    def set_state(state):
+        """Copy the arrays of `get_state` back into the tables, the views stay valid."""
+        for table, arrays in state:
+            for name, array in arrays.items():
+                getattr(table, name)[:] = array
+
+    @staticmethod
+    def deactivate(view):
+        """Stop updating the entity, as it's removed from the level's active entities."""
+        view.table.is_updated[view.index] = False
+
+
+class _WallLayout:
+    """The level tile layout as a 2D array of wall flags."""
+
+    def __init__(self, walls):
+        self._walls = walls
+        self.size = walls.cell_size
+        self.rows = walls.rows
+        self.columns = walls.columns
+        self._cells = np.frombuffer(bytes(walls.cells), dtype=np.uint8).reshape(self.rows, self.columns) > 0
+
+    def get_cells(self, x, y, width, height):
+        """The first and the last column and row the rects overlap."""
+        size = self.size
+        return x // size, (x + width - 1) // size, y // size, (y + height - 1) // size
+
+    def sweep(self, x, y, width, height, dx, dy):
+        """
+        `WallGrid.sweep` the moves longer than a tile in `dx` and `dy`, in place.
+        Such moves only come with a high time acceleration or a slow frame, the rest of the moves are left alone.
+        """
+        size = self.size
+        for i in np.flatnonzero((np.abs(dx) > size) | (np.abs(dy) > size)).tolist():
+            rect = pygame.Rect(int(x[i]), int(y[i]), width, height)
+            dx[i], dy[i] = self._walls.sweep(rect, int(dx[i]), int(dy[i]))
+
+    def iter_colliding(self, x, y, width, height):
+        """
+        Yield the walls colliding with the rects as (collision mask, wall lefts, wall tops), cell by cell
+        in the row by row order of `WallGrid.get_rects`; entities are no larger than a tile, so it's 4 cells at most.
+        The check is lazy, the caller may resolve the collisions in place (move `x` and `y`) before the next cell.
+        """
+        if not self.rows or not self.columns:
+            return
+        size = self.size
+        left_column, right_column, top_row, bottom_row = self.get_cells(x, y, width, height)
+        for row, is_other_row in ((top_row, False), (bottom_row, True)):
+            for column, is_other_column in ((left_column, False), (right_column, True)):
+                is_candidate = self._is_wall(row, column)
+                if is_other_row:
+                    is_candidate &= bottom_row != top_row
+                if is_other_column:
+                    is_candidate &= right_column != left_column
+                if not is_candidate.any():
+                    continue
+                left = column * size
+                top = row * size
+                is_colliding = is_candidate & (x < left + size) & (left < x + width) & (y < top + size) & (top < y + height)
+                if is_colliding.any():
+                    yield is_colliding, left, top
+
+    def _is_wall(self, row, column):
+        is_inside = (row >= 0) & (row < self.rows) & (column >= 0) & (column < self.columns)
+        return is_inside & self._cells[row.clip(0, self.rows - 1), column.clip(0, self.columns - 1)]
+
+
+class EntityTable:
+    """Arrays of one entity type's state; `x` and `y` hold the top left corners of the entity rects."""
+    ENTITY_CLASS = None
+    VIEW_CLASS = None
+
+    def __init__(self, entities):
+        rects = [entity.rect for entity in entities]
+        self.width, self.height = rects[0].size
+        self.x = np.array([rect.x for rect in rects], dtype=np.int64)
+        self.y = np.array([rect.y for rect in rects], dtype=np.int64)
+
+        previous_positions = [entity.previous_position or (0, 0) for entity in entities]
+        self.previous_x = np.array([x for x, _ in previous_positions], dtype=np.int64)
+        self.previous_y = np.array([y for _, y in previous_positions], dtype=np.int64)
+        self.has_previous_position = np.array([entity.previous_position is not None for entity in entities])
+
+        self.is_active = np.array([entity.is_active for entity in entities])
+        self.is_updated = self.is_active.copy()  # mirrors the level's active entities
+
+        self.views = [self.VIEW_CLASS(self, i, entity) for i, entity in enumerate(entities)]
+
+    def step(self, time, level, layout):
+        """Advance the updated entities, returns their indexes and the cells they were in."""
+        index = np.flatnonzero(self.is_updated)
+        x, y = self.x[index], self.y[index]
+        previous_cells = layout.get_cells(x, y, self.width, self.height)
+        self.previous_x[index] = x
+        self.previous_y[index] = y
+        self.has_previous_position[index] = True
+        if len(index):
+            self.step_entities(index, x, y, time, level, layout)
+            self.x[index] = x
+            self.y[index] = y
+        return index, previous_cells
+
+    def step_entities(self, index, x, y, time, level, layout):
+        """Move the entities in `x` and `y` in place."""
+        raise NotImplementedError
+
+
+class LavaTable(EntityTable):
+
+    def __init__(self, entities):
+        self.direction_x = np.array([entity.direction.x for entity in entities])
+        self.direction_y = np.array([entity.direction.y for entity in entities])
+        self.init_x = np.array([entity.init_location.x for entity in entities])
+        self.init_y = np.array([entity.init_location.y for entity in entities])
+        self.is_repeatable = np.array([entity.is_repeatable for entity in entities])
+        super().__init__(entities)
+
+    def step_entities(self, index, x, y, time, level, layout):
+        speed = 0.1
+        step = speed * level.speed_factor * time
+        direction_x, direction_y = self.direction_x[index], self.direction_y[index]
+        dx = (direction_x * step).astype(np.int64)  # rects truncate the moves, like `Entity.move`
+        dy = (direction_y * step).astype(np.int64)
+        layout.sweep(x, y, self.width, self.height, dx, dy)
+        x += dx
+        y += dy
+
+        is_repeatable = self.is_repeatable[index]
+        for is_colliding, left, top in layout.iter_colliding(x, y, self.width, self.height):
+            is_reset = is_colliding & is_repeatable
+            if is_reset.any():
+                x[is_reset] = self.init_x[index][is_reset].astype(np.int64)
+                y[is_reset] = self.init_y[index][is_reset].astype(np.int64)
+                self.has_previous_position[index[is_reset]] = False  # don't draw it flying back
+
+            is_bounced = is_colliding & ~is_repeatable
+            for mask, values in (
+                (is_bounced & (direction_x > 0), left - self.width),
+                (is_bounced & (direction_x < 0), left + layout.size),
+            ):
+                x[mask] = values[mask]
+            for mask, values in (
+                (is_bounced & (direction_y > 0), top - self.height),
+                (is_bounced & (direction_y < 0), top + layout.size),
+            ):
+                y[mask] = values[mask]
+            direction_x[is_bounced] *= -1  # turned around
+            direction_y[is_bounced] *= -1
+
+        self.direction_x[index] = direction_x
+        self.direction_y[index] = direction_y
+
+
+class CoinTable(EntityTable):
+
+    def __init__(self, entities):
+        self.timeline = np.array([entity.timeline for entity in entities], dtype=np.float64)
+        self.init_x = np.array([entity.init_location.x for entity in entities])
+        self.init_y = np.array([entity.init_location.y for entity in entities])
+        super().__init__(entities)
+
+    def step_entities(self, index, x, y, time, level, layout):
+        timeline = self.timeline[index] + time * 1e-3 * Coin.WOBBLE_SPEED * level.speed_factor
+        wobble = Coin.WOBBLE_DIST * level.speed_factor * np.sin(timeline)
+        dy = wobble.astype(np.int64)
+        layout.sweep(x, y, self.width, self.height, np.zeros_like(dy), dy)
+        y += dy
+
+        for is_colliding, left, top in layout.iter_colliding(x, y, self.width, self.height):
+            is_pushed_up = is_colliding & (y > 0)
+            is_pushed_down = is_colliding & (y < 0)
+            y[is_pushed_up] = (top - self.height)[is_pushed_up]
+            y[is_pushed_down] = (top + layout.size)[is_pushed_down]
+
+        self.timeline[index] = timeline
+
+
+class MonsterTable(EntityTable):
+
+    def __init__(self, entities):
+        self.direction = np.array([entity.direction for entity in entities], dtype=np.float64)
+        self.health = np.array([entity._health for entity in entities], dtype=np.float64)
+        self.dying_time = np.array(
+            [math.nan if entity._dying_time is None else entity._dying_time for entity in entities],
+        )
+        self.color_shift = np.array([entity._color_shift for entity in entities], dtype=np.float64)
+        self.is_auto_target = np.array([entity.is_auto_target for entity in entities])
+        self._runs = None  # the navigation field's, as an array
+        super().__init__(entities)
+
+    def step_entities(self, index, x, y, time, level, layout):
+        player_rect = level.player.rect
+        direction = self.direction[index]
+        dying_time = self.dying_time[index]
+        is_dying = ~np.isnan(dying_time)
+        is_auto_target = self.is_auto_target[index]
+
+        speed = np.full(len(index), 0.15)
+        dist_x = player_rect.centerx - (x + self.width // 2)
+        is_chasing = is_auto_target & ~is_dying & (np.abs(dist_x) < 350)
+        if is_chasing.any():
+            is_chasing &= self._is_reachable(x, y, level.navigation)
+        vertical_dist = player_rect.bottom - y
+        is_next_to_player = is_chasing & (0 < vertical_dist) & (vertical_dist < 50)
+        is_turned = is_next_to_player & (dist_x != 0)
+        direction[is_turned] = dist_x[is_turned] / np.abs(dist_x[is_turned])
+        speed[is_next_to_player] *= 2
+        is_player_bounced = (
+            is_chasing & ~is_next_to_player & (-50 < vertical_dist) & (vertical_dist < 0) & (level.player.dy < 0)
+        )
+        speed[is_player_bounced] *= 3
+        speed[is_dying] *= dying_time[is_dying] / Monster.DYING_TIME
+
+        if 0 <= level.speed_factor < 1:
+            speed_factor = np.where(is_auto_target & (self.health[index] < Monster.MAX_HEALTH), 1.0, level.speed_factor)
+        else:
+            speed_factor = np.full(len(index), float(level.speed_factor))
+        step = speed * speed_factor * time
+
+        color_shift = self.color_shift[index]
+        color_shift[is_auto_target] += (speed_factor * time * 0.01)[is_auto_target]
+        color_shift[color_shift > math.pi * 100] = 0  # prevent overflow
+        self.color_shift[index] = color_shift
+
+        dx = (direction * step).astype(np.int64)
+        layout.sweep(x, y, self.width, self.height, dx, np.zeros_like(dx))
+        x += dx
+        for is_colliding, left, top in layout.iter_colliding(x, y, self.width, self.height):
+            is_moving_right = is_colliding & (direction > 0)
+            is_moving_left = is_colliding & (direction < 0)
+            x[is_moving_right] = (left - self.width)[is_moving_right]
+            x[is_moving_left] = (left + layout.size)[is_moving_left]
+            direction[is_colliding] *= -1
+        self.direction[index] = direction
+
+        dying_time[is_dying] -= time * level.speed_factor
+        self.dying_time[index] = dying_time
+        is_dead = is_dying & (dying_time <= 0)
+        for i in index[is_dead].tolist():
+            self.is_active[i] = False
+            level.on_monster_died(self.views[i])
+
+    def _is_reachable(self, x, y, navigation):
+        """`NavigationField.is_reachable` of the monster centers."""
+        if not navigation.reachable_runs:
+            return np.zeros(len(x), dtype=bool)
+        if self._runs is None:
+            self._runs = np.frombuffer(navigation.runs, dtype=np.intc)
+        column = (x + self.width // 2) // navigation.cell_size
+        row = (y + self.height // 2) // navigation.cell_size
+        is_inside = (row >= 0) & (row < navigation.rows) & (column >= 0) & (column < navigation.columns)
+        runs = self._runs[row.clip(0, navigation.rows - 1) * navigation.columns + column.clip(0, navigation.columns - 1)]
+        return is_inside & np.isin(runs, tuple(navigation.reachable_runs))
+
+
+class EntityView:
+    """An entity whose state is a row of an engine table."""
+    STATIC_FIELDS = ()  # copied from the entity, they never change
+
+    def __init__(self, table, index, entity):
+        self.table = table
+        self.index = index
+        self._sprite = None
+        for field in self.STATIC_FIELDS:
+            setattr(self, field, getattr(entity, field))
+
+    @property
+    def rect(self):
+        table, i = self.table, self.index
+        return pygame.Rect(int(table.x[i]), int(table.y[i]), table.width, table.height)
+
+    @property
+    def is_active(self):
+        return bool(self.table.is_active[self.index])
+
+    @is_active.setter
+    def is_active(self, value):
+        self.table.is_active[self.index] = value
+
+    @property
+    def previous_position(self):
+        table, i = self.table, self.index
+        if not table.has_previous_position[i]:
+            return None
+        return int(table.previous_x[i]), int(table.previous_y[i])
+
+    @previous_position.setter
+    def previous_position(self, value):
+        table, i = self.table, self.index
+        table.has_previous_position[i] = value is not None
+        if value is not None:
+            table.previous_x[i], table.previous_y[i] = value
+
+
+class LavaView(EntityView, Lava):
+    STATIC_FIELDS = ("init_location", "is_repeatable")
+
+    @property
+    def direction(self):
+        return pygame.Vector2(float(self.table.direction_x[self.index]), float(self.table.direction_y[self.index]))
+
+    @direction.setter
+    def direction(self, value):
+        self.table.direction_x[self.index], self.table.direction_y[self.index] = value
+
+
+class CoinView(EntityView, Coin):
+    STATIC_FIELDS = ("init_location",)
+
+    @property
+    def timeline(self):
+        return float(self.table.timeline[self.index])
+
+    @timeline.setter
+    def timeline(self, value):
+        self.table.timeline[self.index] = value
+
+
+class MonsterView(EntityView, Monster):
+    STATIC_FIELDS = ("init_location", "is_auto_target")
+
+    @property
+    def direction(self):
+        return float(self.table.direction[self.index])
+
+    @direction.setter
+    def direction(self, value):
+        self.table.direction[self.index] = value
+
+    @property
+    def _health(self):
+        return float(self.table.health[self.index])
+
+    @_health.setter
+    def _health(self, value):
+        self.table.health[self.index] = value
+
+    @property
+    def _dying_time(self):
+        value = float(self.table.dying_time[self.index])
+        return None if math.isnan(value) else value
+
+    @_dying_time.setter
+    def _dying_time(self, value):
+        self.table.dying_time[self.index] = math.nan if value is None else value
+
+    @property
+    def _color_shift(self):
+        return float(self.table.color_shift[self.index])
+
+    @_color_shift.setter
+    def _color_shift(self, value):
+        self.table.color_shift[self.index] = value
+
+
+LavaTable.ENTITY_CLASS, LavaTable.VIEW_CLASS = Lava, LavaView
+CoinTable.ENTITY_CLASS, CoinTable.VIEW_CLASS = Coin, CoinView
+MonsterTable.ENTITY_CLASS, MonsterTable.VIEW_CLASS = Monster, MonsterView
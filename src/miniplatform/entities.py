@@ -1,24 +1,41 @@
 import abc
 import contextlib
-import functools
 import logging
 import math
+import operator
 import random
+import struct
 
 import pygame
 
-from miniplatform.configs import config, adjust_color
-from miniplatform.effects import Sound
+from miniplatform.configs import config
+from miniplatform.effects import Sound, fadeout_soundtrack
+from miniplatform.profiling import profiler
 from miniplatform.serializers import Serializable
 
 
+class Block:
+    """A wall tile. Walls aren't entities, they're kept in the level's wall grid."""
+    SIZE = 20
+    COLOR = (60, 60, 60)
+
+
 class Entity(Serializable):
+    """Entities are slotted, there may be a lot of them on big levels."""
+    __slots__ = ("rect", "is_active", "previous_position", "_sprite")
+
+    JOURNAL_FIELDS = None  # representation fields that make a save journal entry, all of them by default
+    RECORD = None  # packs the representation fields in binary saves
+    TYPE = None  # in the representation
 
     def __init__(self, location):
-        self.location = location
+        self.rect = self.get_rect(location)
         self.is_active = True
+        self.previous_position = None  # before the last update, rendering interpolates from it
+        self._sprite = None  # created on the first render
 
     def update(self, time, level):
+        self.previous_position = self.rect.topleft
         self.update_state(time, level)
 
     @abc.abstractmethod
@@ -26,37 +43,75 @@ class Entity(Serializable):
         ...
 
     def render(self, screen):
-        self.sprite.center = self.rect.center
-
-        self.sprite.left -= config.offset_x
-        self.sprite.top -= config.offset_y
-
-        self.render_entity(screen)
+        x, y = self.get_render_position()
+        self.sprite.topleft = (x - config.offset_x, y - config.offset_y)
+
+        return self.render_entity(screen)
+
+    def get_render_position(self):
+        x, y = self.rect.topleft
+        alpha = config.interpolation
+        if self.previous_position is None or alpha >= 1:
+            return x, y
+        previous_x, previous_y = self.previous_position
+        return (
+            round(previous_x + (x - previous_x) * alpha),
+            round(previous_y + (y - previous_y) * alpha),
+        )
 
     @abc.abstractmethod
     def render_entity(self, screen):
         ...
 
     @abc.abstractmethod
-    def get_rect(self):
+    def get_rect(self, location):
         ...
 
-    @functools.cached_property
-    def rect(self):
-        return self.get_rect()
-
-    @functools.cached_property
+    @property
     def sprite(self):
-        return self.get_rect()
+        """The rect on the screen."""
+        if self._sprite is None:
+            self._sprite = self.rect.copy()
+        return self._sprite
 
     def collides(self, entity):
         return self.rect.colliderect(entity.rect)
 
+    def move(self, dx, dy, level):
+        """
+        Move the rect. A move longer than a tile, on a slow frame or at a high time acceleration,
+        is swept along the walls and cut short at the first one, so the entity can't pass through it.
+        """
+        dx, dy = int(dx), int(dy)  # rects truncate the moves
+        if abs(dx) > Block.SIZE or abs(dy) > Block.SIZE:
+            dx, dy = level.walls.sweep(self.rect, dx, dy)
+        self.rect.move_ip(dx, dy)
+
+    def respawn(self, position, record):
+        """Put the entity back in place into the state of its `to_record` taken on spawn, nothing is reallocated."""
+        self.rect.topleft = position
+        self.is_active = True
+        self.previous_position = None
+
 
 class Player(Entity):
+    __slots__ = (
+        "dx",
+        "dy",
+        "is_on_ground",
+        "_is_won",
+        "_is_dead",
+        "_finalization_time",
+        "is_alive",
+        "is_dead",
+        "is_winner",
+    )
+
+    TYPE = "player"
     WIDTH = 16
     HEIGHT = 30
     PLAYER_STEP = 0.01
+    RECORD = struct.Struct("<2i2d3?d")
 
     def __init__(self, location):
         super().__init__(location)
@@ -78,15 +133,9 @@ class Player(Entity):
             gravity = 0.0005
             self.dy += gravity * time
         self.is_on_ground = False
-        self.rect.move_ip(
-            0,
-            self.dy * time,
-        )
+        self.move(0, self.dy * time, level)
         self._handle_collision(level, is_vertical=True)
-        self.rect.move_ip(
-            self.dx * time,
-            0,
-        )
+        self.move(self.dx * time, 0, level)
         self._handle_collision(level, is_vertical=False)
         if self._is_dead or self._is_won:
             self._finalization_time -= time * level.time_acceleration
@@ -94,10 +143,10 @@ class Player(Entity):
 
         self._post_update_state()
 
-    def get_rect(self):
+    def get_rect(self, location):
         return pygame.Rect(
-            self.location.x,
-            self.location.y,
+            location.x,
+            location.y,
             self.WIDTH,
             self.HEIGHT,
         )
@@ -109,7 +158,7 @@ class Player(Entity):
             color = (255, 255, 0)
         else:
             color = (50, 200, 100)
-        pygame.draw.rect(screen, adjust_color(color), self.sprite)
+        return pygame.draw.rect(screen, color, self.sprite)
 
     def move_left(self, time):
         self.dx = -self.PLAYER_STEP * time
@@ -123,7 +172,7 @@ class Player(Entity):
             Sound.JUMP.play()
 
     def set_position(self, position):
-        self.location = position
+        self.rect.topleft = position
 
     def set_dead(self):
         if not (self._is_won or self._is_dead):
@@ -138,7 +187,7 @@ class Player(Entity):
             self._is_won = True
             Sound.VICTORY.play()
             if level.is_final:
-                pygame.mixer.music.fadeout(self._finalization_time)
+                fadeout_soundtrack(self._finalization_time)
             config.color_factor = 1
 
     def _post_update_state(self):
@@ -146,31 +195,44 @@ class Player(Entity):
         self.is_dead = not self._is_won and self._is_dead and self._finalization_time <= 0
         self.is_winner = not self._is_dead and self._is_won and self._finalization_time <= 0
 
+    @profiler.timed("collision")
     def _handle_collision(self, level, is_vertical):
-        for entity in level.active_entities:
-            if self.collides(entity):
-                if isinstance(entity, Block):
+        # walls and entities are met in the map order, a wall pushing the player away
+        # only takes effect for what comes after it on the map
+        size = Block.SIZE
+        obstacles = [
+            ((wall.top // size, wall.left // size), wall) for wall in level.walls.get_rects(self.rect, margin=1)
+        ]
+        obstacles.extend(
+            ((int(entity.init_location.y) // size, int(entity.init_location.x) // size), entity)  # the spawn tile
+            for entity in level.spatial_index.query(self.rect)
+        )
+        obstacles.sort(key=operator.itemgetter(0))
+        for _, entity in obstacles:
+            if isinstance(entity, pygame.Rect):
+                if self.rect.colliderect(entity):
                     self._handle_wall_collision(entity, is_vertical)
-                elif isinstance(entity, Lava):
+            elif self.collides(entity):
+                if isinstance(entity, Lava):
                     self.set_dead()
                 elif isinstance(entity, Coin):
                     entity.set_taken(level)
                 elif isinstance(entity, Monster):
                     entity.touch_player(player=self)
 
-    def _handle_wall_collision(self, block, is_vertical):
+    def _handle_wall_collision(self, wall, is_vertical):
         if self.dx != 0 and not is_vertical:
             if self.dx > 0:
-                self.rect.right = block.rect.left
+                self.rect.right = wall.left
             elif self.dx < 0:
-                self.rect.left = block.rect.right
+                self.rect.left = wall.right
             self.dx = 0
         if self.dy != 0 and is_vertical:
             if self.dy > 0:
-                self.rect.bottom = block.rect.top
+                self.rect.bottom = wall.top
                 self.is_on_ground = True
             elif self.dy < 0:
-                self.rect.top = block.rect.bottom
+                self.rect.top = wall.bottom
             self.dy = 0
 
     @classmethod
@@ -185,7 +247,7 @@ class Player(Entity):
 
     def to_representation(self):
         return {
-            "type": "player",
+            "type": self.TYPE,
             "location": [self.rect.x, self.rect.y],
             "dx": self.dx,
             "dy": self.dy,
@@ -195,14 +257,47 @@ class Player(Entity):
             "_finalization_time": self._finalization_time,
         }
 
+    @classmethod
+    def from_record(cls, record):
+        x, y, dx, dy, is_on_ground, is_won, is_dead, finalization_time = record
+        obj = cls(location=pygame.Vector2(x, y))
+        obj.dx = dx
+        obj.dy = dy
+        obj.is_on_ground = is_on_ground
+        obj._is_won = is_won
+        obj._is_dead = is_dead
+        obj._finalization_time = finalization_time
+        obj._post_update_state()
+        return obj
+
+    def to_record(self):
+        return (
+            self.rect.x,
+            self.rect.y,
+            self.dx,
+            self.dy,
+            self.is_on_ground,
+            self._is_won,
+            self._is_dead,
+            self._finalization_time,
+        )
+
+    def respawn(self, position, record):
+        super().respawn(position, record)
+        _, _, self.dx, self.dy, self.is_on_ground, self._is_won, self._is_dead, self._finalization_time = record
+        self._post_update_state()
+
 
 class Lava(Entity):
+    __slots__ = ("init_location", "direction", "is_repeatable")
+
+    TYPE = "lava"
     SCALE = 0.9
+    MARGIN = Block.SIZE * (1 - SCALE) * 0.5  # around the rect, within the tile
+    RECORD = struct.Struct("<6d?")
 
     def __init__(self, location, direction, is_repeatable, init_location=None):
-        margin = Block.SIZE * (1 - self.SCALE) * 0.5
-        self.margin = pygame.Vector2(margin, margin)
-        super().__init__(location=location + self.margin)
+        super().__init__(location)
         self.init_location = init_location or location
         self.direction = direction
         self.is_repeatable = is_repeatable
@@ -210,34 +305,34 @@ class Lava(Entity):
     def update_state(self, time, level):
         speed = 0.1
         step = speed * level.speed_factor * time
-        self.rect.move_ip(self.direction.x * step, self.direction.y * step)
+        self.move(self.direction.x * step, self.direction.y * step, level)
         self._handle_collision(level)
 
-    def get_rect(self):
+    def get_rect(self, location):
         size = Block.SIZE * self.SCALE
-        return pygame.Rect(self.location.x, self.location.y, size, size)
+        return pygame.Rect(location.x + self.MARGIN, location.y + self.MARGIN, size, size)
 
     def render_entity(self, screen):
         color = (255, 100, 100)
-        pygame.draw.rect(screen, adjust_color(color), self.sprite)
+        return pygame.draw.rect(screen, color, self.sprite)
 
+    @profiler.timed("collision")
     def _handle_collision(self, level):
-        for entity in level.active_entities:
-            if self.collides(entity):
-                if isinstance(entity, Block):
-                    if self.is_repeatable:
-                        self.rect.left = self.init_location.x
-                        self.rect.top = self.init_location.y
-                    else:
-                        if self.direction.x > 0:
-                            self.rect.right = entity.rect.left
-                        elif self.direction.x < 0:
-                            self.rect.left = entity.rect.right
-                        if self.direction.y > 0:
-                            self.rect.bottom = entity.rect.top
-                        elif self.direction.y < 0:
-                            self.rect.top = entity.rect.bottom
-                        self.direction.rotate_ip(180)
+        for wall in level.walls.get_colliding_rects(self.rect):
+            if self.is_repeatable:
+                self.rect.left = self.init_location.x
+                self.rect.top = self.init_location.y
+                self.previous_position = None  # don't draw it flying back
+            else:
+                if self.direction.x > 0:
+                    self.rect.right = wall.left
+                elif self.direction.x < 0:
+                    self.rect.left = wall.right
+                if self.direction.y > 0:
+                    self.rect.bottom = wall.top
+                elif self.direction.y < 0:
+                    self.rect.top = wall.bottom
+                self.direction.rotate_ip(180)
 
     @classmethod
     def to_internal_value(cls, data):
@@ -250,19 +345,49 @@ class Lava(Entity):
         return obj
 
     def to_representation(self):
-        location = pygame.Vector2(self.rect.x, self.rect.y) - self.margin
         return {
-            "type": "lava",
-            "location": [location.x, location.y],
+            "type": self.TYPE,
+            "location": [self.rect.x - self.MARGIN, self.rect.y - self.MARGIN],
             "init_location": [self.init_location.x, self.init_location.y],
             "direction": [self.direction.x, self.direction.y],
             "is_repeatable": self.is_repeatable,
         }
 
+    @classmethod
+    def from_record(cls, record):
+        x, y, init_x, init_y, direction_x, direction_y, is_repeatable = record
+        return cls(
+            location=pygame.Vector2(x, y),
+            direction=pygame.Vector2(direction_x, direction_y),
+            is_repeatable=is_repeatable,
+            init_location=pygame.Vector2(init_x, init_y),
+        )
+
+    def to_record(self):
+        return (
+            self.rect.x - self.MARGIN,
+            self.rect.y - self.MARGIN,
+            self.init_location.x,
+            self.init_location.y,
+            self.direction.x,
+            self.direction.y,
+            self.is_repeatable,
+        )
+
+    def respawn(self, position, record):
+        super().respawn(position, record)
+        _, _, _, _, direction_x, direction_y, _ = record
+        self.direction.update(direction_x, direction_y)
+
 
 class Coin(Entity):
+    __slots__ = ("init_location", "timeline")
+
+    TYPE = "coin"
     WOBBLE_SPEED = 6
     WOBBLE_DIST = 2
+    JOURNAL_FIELDS = ("is_active",)  # the wobble alone isn't worth saving
+    RECORD = struct.Struct("<2i3d?")
 
     def __init__(self, location, init_location=None, timeline=None):
         super().__init__(location)
@@ -272,13 +397,13 @@ class Coin(Entity):
     def update_state(self, time, level):
         self.timeline += time * 1e-3 * self.WOBBLE_SPEED * level.speed_factor
         wobble = self.WOBBLE_DIST * level.speed_factor * math.sin(self.timeline)
-        self.rect.move_ip(0, wobble)
+        self.move(0, wobble, level)
         self._handle_collision(level)
 
-    def get_rect(self):
+    def get_rect(self, location):
         return pygame.Rect(
-            self.location.x,
-            self.location.y,
+            location.x,
+            location.y,
             Block.SIZE,
             Block.SIZE,
         )
@@ -286,25 +411,24 @@ class Coin(Entity):
     def render_entity(self, screen):
         color = (255, 215, 0)
         radius = Block.SIZE // 3
-        pygame.draw.circle(
+        return pygame.draw.circle(
             screen,
-            adjust_color(color),
+            color,
             self.sprite.center,
             radius,
         )
 
+    @profiler.timed("collision")
     def _handle_collision(self, level):
-        for entity in level.active_entities:
-            if self.collides(entity):
-                if isinstance(entity, Block):
-                    if self.rect.y > 0:
-                        self.rect.bottom = entity.rect.top
-                    elif self.rect.y < 0:
-                        self.rect.top = entity.rect.bottom
+        for wall in level.walls.get_colliding_rects(self.rect):
+            if self.rect.y > 0:
+                self.rect.bottom = wall.top
+            elif self.rect.y < 0:
+                self.rect.top = wall.bottom
 
     def set_taken(self, level):
         self.is_active = False
-        level.refresh_stats_text()
+        level.on_coin_taken(self)
         Sound.COIN.play()
 
     @classmethod
@@ -320,65 +444,61 @@ class Coin(Entity):
 
     def to_representation(self):
         return {
-            "type": "coin",
+            "type": self.TYPE,
             "location": [self.rect.x, self.rect.y],
             "init_location": [self.init_location.x, self.init_location.y],
             "timeline": self.timeline,
             "is_active": self.is_active,
         }
 
-
-class Block(Entity):
-    SIZE = 20
-
-    def get_rect(self):
-        return pygame.Rect(self.location.x, self.location.y, self.SIZE, self.SIZE)
-
-    def update_state(self, time, level):
-        pass
-
-    def render_entity(self, screen):
-        color = (60, 60, 60)
-        pygame.draw.rect(screen, color, self.sprite)
-
     @classmethod
-    def to_internal_value(cls, data):
-        data.pop("type")
-        location = pygame.Vector2(data.pop("location"))
-        obj = cls(location=location)
+    def from_record(cls, record):
+        x, y, init_x, init_y, timeline, is_active = record
+        obj = cls(location=pygame.Vector2(x, y), init_location=pygame.Vector2(init_x, init_y), timeline=timeline)
+        obj.is_active = is_active
         return obj
 
-    def to_representation(self):
-        return {
-            "type": "block",
-            "location": [self.rect.x, self.rect.y],
-        }
+    def to_record(self):
+        return (self.rect.x, self.rect.y, self.init_location.x, self.init_location.y, self.timeline, self.is_active)
+
+    def respawn(self, position, record):
+        super().respawn(position, record)
+        _, _, _, _, self.timeline, self.is_active = record
 
 
 class Monster(Entity):
+    __slots__ = ("init_location", "is_auto_target", "direction", "_dying_time", "_health", "_color_shift")
+
+    TYPE = "monster"
     SCALE = 0.8
+    MARGIN = Block.SIZE * (1 - SCALE) * 0.5
     DYING_TIME = 3_000
     MAX_HEALTH = 100
+    RESILIENCE = 4  # punches to kill
+    AUTO_TARGET_RESILIENCE = 10
+    RECORD = struct.Struct("<4d?d?d")
 
     def __init__(self, location, init_location=None, is_auto_target=False):
-        margin = Block.SIZE * (1 - self.SCALE) * 0.5
-        self.margin = pygame.Vector2(margin, margin)
-        super().__init__(location=location + self.margin)
+        super().__init__(location)
         self.init_location = init_location or location
         self.is_auto_target = is_auto_target
         self.direction = random.choice([-1, 1])
         self._dying_time = None
         self._health = self.MAX_HEALTH
-        resilience = 10 if is_auto_target else 4
-        self._damage = self._health / resilience
         self._color_shift = 0
 
+    @property
+    def _damage(self):
+        resilience = self.AUTO_TARGET_RESILIENCE if self.is_auto_target else self.RESILIENCE
+        return self.MAX_HEALTH / resilience
+
     def update_state(self, time, level):
         speed = 0.15
         if (
             self.is_auto_target  # a monster will chase the player if they're close to each other
             and self._dying_time is None
             and abs((dist_x := level.player.rect.centerx - self.rect.centerx)) < 350
+            and level.navigation.is_reachable(*self.rect.center)  # and there's no wall between them
         ):
             vertical_dist = level.player.rect.bottom - self.rect.top
             if 0 < vertical_dist < 50:  # the player is standing next to a monster
@@ -398,19 +518,19 @@ class Monster(Entity):
             self._color_shift += speed_factor * time * 0.01
             if self._color_shift > math.pi * 100:  # prevent overflow
                 self._color_shift = 0
-        self.rect.move_ip(self.direction * step, 0)
+        self.move(self.direction * step, 0, level)
         self._handle_collision(level)
 
         if self._dying_time is not None:
             self._dying_time -= time * level.speed_factor
             if self._dying_time <= 0:
                 self.is_active = False
-                level.refresh_stats_text()
+                level.on_monster_died(self)
 
 
-    def get_rect(self):
+    def get_rect(self, location):
         w, h = (Block.SIZE, Block.SIZE * self.SCALE)
-        return pygame.Rect(self.location.x, self.location.y, w, h)
+        return pygame.Rect(location.x + self.MARGIN, location.y + self.MARGIN, w, h)
 
     def render_entity(self, screen):
         pulse = self._color_shift and math.sin(self._color_shift)
@@ -420,17 +540,16 @@ class Monster(Entity):
             if self._dying_time is None
             else (15, 10, 10)
         )
-        pygame.draw.rect(screen, adjust_color(color), self.sprite)
+        return pygame.draw.rect(screen, color, self.sprite)
 
+    @profiler.timed("collision")
     def _handle_collision(self, level):
-        for entity in level.active_entities:
-            if self.collides(entity):
-                if isinstance(entity, Block):
-                    if self.direction > 0:
-                        self.rect.right = entity.rect.left
-                    elif self.direction < 0:
-                        self.rect.left = entity.rect.right
-                    self.direction *= -1
+        for wall in level.walls.get_colliding_rects(self.rect):
+            if self.direction > 0:
+                self.rect.right = wall.left
+            elif self.direction < 0:
+                self.rect.left = wall.right
+            self.direction *= -1
 
     @classmethod
     def to_internal_value(cls, data):
@@ -444,10 +563,9 @@ class Monster(Entity):
         return obj
 
     def to_representation(self):
-        location = pygame.Vector2(self.rect.x, self.rect.y) - self.margin
         return {
-            "type": "monster",
-            "location": [location.x, location.y],
+            "type": self.TYPE,
+            "location": [self.rect.x - self.MARGIN, self.rect.y - self.MARGIN],
             "init_location": [self.init_location.x, self.init_location.y],
             "is_auto_target": self.is_auto_target,
             "direction": self.direction,
@@ -455,6 +573,37 @@ class Monster(Entity):
             "_health": self._health,
         }
 
+    @classmethod
+    def from_record(cls, record):
+        x, y, init_x, init_y, is_auto_target, direction, is_active, health = record
+        obj = cls(
+            location=pygame.Vector2(x, y),
+            init_location=pygame.Vector2(init_x, init_y),
+            is_auto_target=is_auto_target,
+        )
+        obj.direction = direction
+        obj.is_active = is_active
+        obj._health = health
+        return obj
+
+    def to_record(self):
+        return (
+            self.rect.x - self.MARGIN,
+            self.rect.y - self.MARGIN,
+            self.init_location.x,
+            self.init_location.y,
+            self.is_auto_target,
+            self.direction,
+            self.is_active,
+            self._health,
+        )
+
+    def respawn(self, position, record):
+        super().respawn(position, record)
+        _, _, _, _, _, self.direction, self.is_active, self._health = record
+        self._dying_time = None
+        self._color_shift = 0
+
     def touch_player(self, player):
         if (
             player.dy > 0
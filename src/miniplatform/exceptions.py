@@ -2,3 +2,7 @@
 
 class NoLevelError(Exception):
     pass
+
+
+class SaveFormatError(Exception):
+    pass
@@ -1,46 +1,63 @@
+import functools
+import hashlib
 import logging
-import queue
+import struct
 import threading
 import json
 
 import pygame
 
-from miniplatform import effects, commands
+from miniplatform import compilation, effects, commands
 from miniplatform.configs import VAR_DIR
-from miniplatform.exceptions import NoLevelError
+from miniplatform.exceptions import NoLevelError, SaveFormatError
+from miniplatform.hud import text_cache
 from miniplatform.levels import Level
-from miniplatform.serializers import Serializable
+from miniplatform.profiling import profiler
+from miniplatform.serializers import Serializable, write_atomically
 
 
 class Game(Serializable):
     SAVE_GAME_DELAY = 1_000  # every second
+    SAVE_JOURNAL_LIMIT = 60  # journal entries before they're compacted into a new snapshot
+
+    SAVE_MAGIC = b"MPSV"
+    SAVE_FORMAT_VERSION = 1
+    # magic, version, level maps hash, time to reset, save generation, has a level:
+    SAVE_HEADER = struct.Struct("<4sH32sdI?")
+
     GAME_RESET_DELAY = 10_000
 
     INITIAL_TIME = 90_000
     LEVEL_BONUS_TIME = 60_000
 
-    def __init__(self, level_maps=None, initial_time=None):
-        window_sizes = pygame.display.get_window_size()
-
-        end_font = pygame.font.Font(None, 72)
-        self._end_text = end_font.render("Congratulations, You Won!", True, (0, 0, 0))
-        self._end_text_rect = self._end_text.get_rect(
-            center=tuple(size * 0.5 for size in window_sizes),
-        )
-
-        self.level_maps = level_maps if level_maps is not None else Level.load_level_maps()
+    def __init__(self, level_maps=None, initial_time=None, get_pressed=None, is_autosaving=True, is_journaling=False):
+        if level_maps is None:
+            self.compiled_levels = compilation.get_compiled_levels()
+            self.level_maps = self.compiled_levels.level_maps
+        else:
+            self.compiled_levels = None  # other maps are compiled level by level
+            self.level_maps = level_maps
         self.level = None
 
-        self._is_saving_game = False
+        self.is_autosaving = is_autosaving
+        self.is_journaling = is_journaling  # append the changes to a journal in between full snapshots
+        self._save_generation = 0  # of the last snapshot, journal entries belong to it
+        self._journal_size = 0
         self._save_game_delay = self.SAVE_GAME_DELAY
-        self._save_game_queue = queue.Queue(maxsize=2)
-        self._save_game_thread = threading.Thread(target=self._save_game_data, args=(self._save_game_queue,))
+        # handed over to the saving thread, a newer save replaces the one that isn't written yet:
+        self._save_condition = threading.Condition()
+        self._pending_snapshot = None
+        self._pending_journal_entry = None  # merged with the newer entries
+        self._is_save_discarded = False
+        self._is_saving_stopped = False
+        self._save_game_thread = threading.Thread(target=self._save_game_data)
 
         self._time_to_reset_factor = initial_time if initial_time is not None else self.INITIAL_TIME
 
         self._is_game_reset = False
         self._game_reset_time = 0
-        self._input_handler = commands.InputHandler()
+        self._get_pressed = get_pressed
+        self._input_handler = commands.InputHandler(get_pressed=get_pressed)
 
     def update_state(self, time):
         if not self.level:
@@ -51,7 +68,8 @@ class Game(Serializable):
         else:
             self.save_game()
 
-        self._input_handler.handle_input(time)
+        with profiler.measure("input"):
+            self._input_handler.handle_input(time)
         self.level.update(time)
 
         if self._time_to_reset_factor > 0:
@@ -84,9 +102,14 @@ class Game(Serializable):
 
     def render(self, screen):
         if not self.level:
-            screen.blit(self._end_text, self._end_text_rect)  # draw game over
-        else:
-            self.level.redraw(screen)
+            end_text = text_cache.render("Congratulations, You Won!", (0, 0, 0), font_size=72)
+            end_text_rect = end_text.get_rect(center=screen.get_rect().center)
+            return [screen.blit(end_text, end_text_rect)]  # draw game over
+        return self.level.redraw(screen)
+
+    def update_camera(self, screen):
+        if self.level:
+            self.level.update_camera(screen.get_size())
 
     def next_level(self):
         level_number = self.level.number + 1 if self.level else 0
@@ -100,6 +123,7 @@ class Game(Serializable):
                 number=level_number,
                 is_final=level_number == len(self.level_maps) - 1,
                 time_to_reset_factor=self._time_to_reset_factor,
+                compiled_level=self.compiled_levels[level_number] if self.compiled_levels else None,
             )
             if not self._is_game_reset:
                 self._time_to_reset_factor += level_number * self.LEVEL_BONUS_TIME
@@ -112,7 +136,7 @@ class Game(Serializable):
         self.next_level()
         self.reset_level()
 
-        effects.Sound.WORLD_RESET.sound_channel.stop()
+        effects.Sound.WORLD_RESET.stop()
         effects.play_soundtrack()
 
     def reset_level(self):
@@ -129,7 +153,7 @@ class Game(Serializable):
             (pygame.K_RIGHT, commands.MoveRightCommand(player=self.level.player)),
             (pygame.K_UP, commands.JumpCommand(player=self.level.player)),
             (pygame.K_z, commands.TimeStopCommand(level=self.level)),
-        ))
+        ), get_pressed=self._get_pressed)
 
     @classmethod
     def to_internal_value(cls, data):
@@ -137,10 +161,13 @@ class Game(Serializable):
         level_maps = data.pop("level_maps")
         level_data = data.pop("level")
         time_to_reset = data.pop("_time_to_reset_factor")
+        save_generation = data.pop("_save_generation", 0)
 
         obj = cls(level_maps=level_maps, initial_time=time_to_reset)
-        obj.level = Level.to_internal_value(level_data)
-        obj.level.game_time_to_reset_factor = obj._time_to_reset_factor
+        obj.level = Level.to_internal_value(level_data) if level_data else None
+        if obj.level:
+            obj.level.game_time_to_reset_factor = obj._time_to_reset_factor
+        obj._save_generation = save_generation
 
         return obj
 
@@ -150,48 +177,164 @@ class Game(Serializable):
             "level_maps": self.level_maps,
             "level": self.level.to_representation() if self.level else None,
             "_time_to_reset_factor": self._time_to_reset_factor,
+            "_save_generation": self._save_generation,
         }
 
+    @classmethod
+    def from_binary(cls, data, level_maps=None):
+        magic, version, level_maps_digest, time_to_reset, save_generation, has_level = cls.SAVE_HEADER.unpack_from(data)
+        if magic != cls.SAVE_MAGIC:
+            raise SaveFormatError("Not a saved game")
+        if version != cls.SAVE_FORMAT_VERSION:
+            raise SaveFormatError(f"Unsupported save format version {version}")
+
+        obj = cls(level_maps=level_maps, initial_time=time_to_reset)
+        if level_maps_digest != obj.level_maps_digest:
+            raise SaveFormatError("The game was saved with other level maps")
+        if has_level:
+            obj.level = Level.from_binary(memoryview(data)[cls.SAVE_HEADER.size:], obj.level_maps, obj.compiled_levels)
+            obj.level.game_time_to_reset_factor = obj._time_to_reset_factor
+        obj._save_generation = save_generation
+
+        return obj
+
+    def to_binary(self):
+        """A versioned header, the level maps are referenced by their hash instead of being saved, then the level."""
+        return self.pack_binary_records(self.get_binary_records())
+
+    def get_binary_records(self):
+        """An immutable copy of what `to_binary` saves, it can be packed on another thread."""
+        header = (
+            self.SAVE_MAGIC,
+            self.SAVE_FORMAT_VERSION,
+            self.level_maps_digest,
+            self._time_to_reset_factor,
+            self._save_generation,
+            self.level is not None,
+        )
+        return header, self.level.get_binary_records() if self.level else None
+
+    @classmethod
+    def pack_binary_records(cls, records):
+        header, level_records = records
+        data = cls.SAVE_HEADER.pack(*header)
+        return data + Level.pack_binary_records(level_records) if level_records else data
+
+    @functools.cached_property
+    def level_maps_digest(self):
+        return hashlib.sha256(json.dumps(self.level_maps).encode()).digest()
+
     def dispatch_session(self):
         if not self.level:
             self.next_level()
             self.reset_level()
         else:
             self._reset_level_input_handling()
-        self._save_game_thread.start()
+        if self.is_autosaving:
+            self._save_game_thread.start()
 
     def stop_saving_game(self):
-        if self._save_game_thread.is_alive():
-            self._save_game_queue.put(None)
+        """Let the saving thread write what's left and finish."""
+        with self._save_condition:
+            self._is_saving_stopped = True
+            self._save_condition.notify()
 
     def save_game(self, force=False):
-        if force or (self._save_game_delay <= 0 and not self._is_saving_game):
+        """
+        Hand the game state over to the saving thread, it's serialized and written there.
+        Never waits for the thread, a save that isn't written yet is replaced by the newer one.
+        """
+        if not self.is_autosaving:
+            return
+        if force or self._save_game_delay <= 0:
             logging.debug("Saving game ...")
-            self._is_saving_game = True
-            data = self.json()
-            self._save_game_queue.put(data)
+            self._save_game_delay = self.SAVE_GAME_DELAY
+            with profiler.measure("save_game"):
+                # a new level always starts with a snapshot, the level is reset with a forced save
+                if self.is_journaling and not force and self._journal_size < self.SAVE_JOURNAL_LIMIT:
+                    self._journal_size += 1
+                    journal_entry = self._get_journal_entry()
+                    with self._save_condition:
+                        if self._pending_journal_entry is not None:
+                            journal_entry = self._merge_journal_entries(self._pending_journal_entry, journal_entry)
+                        self._pending_journal_entry = journal_entry
+                        self._save_condition.notify()
+                else:
+                    self._journal_size = 0
+                    snapshot = self._get_snapshot()
+                    with self._save_condition:
+                        self._pending_snapshot = snapshot
+                        self._pending_journal_entry = None  # the snapshot has it
+                        self._save_condition.notify()
+
+    def _get_snapshot(self):
+        self._save_generation += 1
+        if self.is_journaling and self.level:
+            self.level.reset_journal()
+        return self.get_binary_records()
+
+    def _get_journal_entry(self):
+        return {
+            "_save_generation": self._save_generation,
+            "level": self.level.to_journal_representation(),
+            "_time_to_reset_factor": self._time_to_reset_factor,
+        }
+
+    @staticmethod
+    def _merge_journal_entries(entry, next_entry):
+        entities_data = {**entry["level"]["_entities"], **next_entry["level"]["_entities"]}
+        return {**next_entry, "level": {**next_entry["level"], "_entities": entities_data}}
+
+    def _has_pending_save(self):
+        return (
+            self._pending_snapshot is not None
+            or self._pending_journal_entry is not None
+            or self._is_save_discarded
+            or self._is_saving_stopped
+        )
 
-    def _save_game_data(self, q):
+    def _save_game_data(self):
         logging.info("Starting automatic game saving")
         file = self.get_saved_game_file()
+        journal_file = self.get_save_journal_file()
         while True:
-            data = q.get()
-            logging.debug("Got save game item to process.")
-            if data is None:  # stopping saving game procedure
+            with self._save_condition:
+                self._save_condition.wait_for(self._has_pending_save)
+                snapshot, journal_entry = self._pending_snapshot, self._pending_journal_entry
+                self._pending_snapshot = self._pending_journal_entry = None
+                is_save_discarded, is_saving_stopped = self._is_save_discarded, self._is_saving_stopped
+
+            if snapshot is not None:
+                write_atomically(file, self.pack_binary_records(snapshot))
+                journal_file.unlink(missing_ok=True)  # compacted into the snapshot
+                self.get_json_saved_game_file().unlink(missing_ok=True)
+                logging.debug("Game saved.")
+            if journal_entry is not None:
+                with journal_file.open(mode="a") as f:  # a cut short last line is skipped on load
+                    f.write(json.dumps(journal_entry) + "\n")
+                logging.debug("Game changes saved.")
+            if is_save_discarded:
+                self._delete_save()
+            if is_saving_stopped:
                 logging.info("Finishing save game loop.")
                 break
-            with file.open(mode="w") as f:
-                f.write(data)
-            self._is_saving_game = False
-            self._save_game_delay = self.SAVE_GAME_DELAY
-            q.task_done()
-            logging.debug("Game saved.")
+
+    @classmethod
+    def _delete_save(cls):
+        cls.get_saved_game_file().unlink(missing_ok=True)
+        cls.get_json_saved_game_file().unlink(missing_ok=True)
+        cls.get_save_journal_file().unlink(missing_ok=True)
 
     def _setup_game_complete(self):
         self.level = None
-        saved_game_file = self.get_saved_game_file()
-        if saved_game_file.exists():
-            saved_game_file.unlink()  # delete the save
+        if self.is_autosaving:
+            if self._save_game_thread.is_alive():
+                with self._save_condition:  # pending saves are dropped, the thread deletes the save after the one it writes
+                    self._pending_snapshot = self._pending_journal_entry = None
+                    self._is_save_discarded = True
+                    self._save_condition.notify()
+            else:
+                self._delete_save()
         self.stop_saving_game()
         effects.play_soundtrack(name="ending")
 
@@ -201,19 +344,75 @@ class Game(Serializable):
             self._is_game_reset = True
             effects.Sound.WORLD_RESET.play()
             fadeout_time = int(self.GAME_RESET_DELAY * 0.5)
-            pygame.mixer_music.fadeout(fadeout_time)
+            effects.fadeout_soundtrack(fadeout_time)
 
     @staticmethod
     def get_saved_game_file():
-        return VAR_DIR / "saved_game.json"
+        return VAR_DIR / "saved_game.bin"
+
+    @staticmethod
+    def get_json_saved_game_file():
+        return VAR_DIR / "saved_game.json"  # saved by the earlier versions
+
+    @staticmethod
+    def get_save_journal_file():
+        return VAR_DIR / "saved_game.journal"
 
     @classmethod
-    def load_game(cls):
+    def read_saved_game(cls):
+        """The saved game file contents: bytes, a string for the earlier JSON saves, None without a save."""
         file = cls.get_saved_game_file()
-        if not file.exists():
+        json_file = cls.get_json_saved_game_file()
+        if file.exists():
+            return file.read_bytes()
+        elif json_file.exists():
+            return json_file.read_text()
+        return None
+
+    @classmethod
+    def load_game(cls, is_journaling=False, saved_game=None):
+        """Restore the saved game, it's read from the disk unless the contents are given."""
+        if saved_game is None:
+            saved_game = cls.read_saved_game()
+
+        obj = None
+        if isinstance(saved_game, bytes):
+            try:
+                obj = cls.from_binary(saved_game)
+            except (SaveFormatError, struct.error) as e:  # struct errors are for a cut short file
+                logging.warning("Can't load the saved game: %s", e)
+        elif saved_game is not None:
+            obj = cls.to_internal_value(json.loads(saved_game))
+
+        if obj is None:
             obj = cls()
         else:
-            with file.open(mode="r") as f:
-                game_data = json.load(f)
-            obj = cls.to_internal_value(game_data)
+            obj._replay_save_journal()
+        obj.is_journaling = is_journaling
         return obj
+
+    def _replay_save_journal(self):
+        if not self.level:
+            return
+        entries = []
+        is_journal_broken = False
+        journal_file = self.get_save_journal_file()
+        if journal_file.exists():
+            with journal_file.open(mode="r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # the last entry may be cut short
+                        logging.warning("Skipping a broken save journal entry")
+                        is_journal_broken = True
+                        break
+                    if entry["_save_generation"] == self._save_generation:  # not left from an older snapshot
+                        entries.append(entry)
+        logging.info("Replaying %s save journal entries", len(entries))
+
+        for entry in entries:
+            self._time_to_reset_factor = entry["_time_to_reset_factor"]
+        self.level.replay_journal([entry["level"] for entry in entries])
+        self.level.game_time_to_reset_factor = self._time_to_reset_factor
+        # entries appended after a broken one would be lost, the next save compacts the journal instead
+        self._journal_size = self.SAVE_JOURNAL_LIMIT if is_journal_broken else len(entries)
@@ -0,0 +1,48 @@
+import collections
+import re
+
+import pygame
+
+from miniplatform.assets import assets
+
+
+class TextCache:
+    """
+    Rendered text surfaces in a bounded LRU cache, keyed by the font size, the text and the colours.
+    Numbers are drawn digit by digit from cached glyphs, a changing counter doesn't render new surfaces.
+    """
+    SIZE = 256  # surfaces
+    FONT_SIZE = 24
+
+    _RUNS = re.compile(r"\d|\D+")  # single digits, and what's in between them
+
+    def __init__(self):
+        self._surfaces = collections.OrderedDict()
+
+    def render(self, text, color, background=None, font_size=FONT_SIZE):
+        key = (font_size, text, color, background)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = assets.get_font(font_size).render(text, True, color, background)
+            self._surfaces[key] = surface
+            if len(self._surfaces) > self.SIZE:
+                self._surfaces.popitem(last=False)
+        else:
+            self._surfaces.move_to_end(key)
+        return surface
+
+    def draw(self, screen, position, text, color, background=None, font_size=FONT_SIZE):
+        """Blit the text piece by piece, returns the drawn area."""
+        x, y = position
+        blits = []
+        for run in self._RUNS.findall(text):
+            surface = self.render(run, color, background, font_size)
+            blits.append((surface, (x, y)))
+            x += surface.get_width()
+        rects = screen.blits(blits)
+        if not rects:
+            return pygame.Rect(position, (0, 0))
+        return rects[0].unionall(rects[1:])
+
+
+text_cache = TextCache()
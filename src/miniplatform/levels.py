@@ -1,13 +1,18 @@
-import json
 import logging
 import math
+import struct
 
 import pygame
 
-from miniplatform import effects
-from miniplatform.configs import config, STATIC_DIR, adjust_color
+from miniplatform import compilation, effects, engine
+from miniplatform.configs import config
 from miniplatform.entities import Block, Lava, Coin, Player, Monster
+from miniplatform.exceptions import SaveFormatError
+from miniplatform.navigation import NavigationField
+from miniplatform.profiling import profiler
+from miniplatform.rendering import LevelView
 from miniplatform.serializers import Serializable
+from miniplatform.spatial import SpatialGrid, WallGrid
 
 
 class Level(Serializable):
@@ -16,14 +21,15 @@ class Level(Serializable):
     TIME_STOP_IDLE = TIME_STOP + TIME_FREEZE
     TIME_ACCELERATION_SCALE = 50
 
-    BAR_WIDTH = 100
+    ENTITY_TYPES = {entity_class.TYPE: entity_class for entity_class in (Lava, Coin, Monster)}
+    # number, entities number, is final, time stop factors, has a player:
+    BINARY_HEADER = struct.Struct("<HI?3d?")
 
-    WARNING_TIME = 30_000
-
-    def __init__(self, level_map, number, is_final=False, time_to_reset_factor=None):
+    def __init__(self, level_map, number, is_final=False, time_to_reset_factor=None, compiled_level=None):
         self.player = None
         self._entities = []
         self.level_map = level_map
+        self.compiled_level = compiled_level or compilation.compile_level(level_map)
         self.number = number
         self.is_final = is_final
 
@@ -36,100 +42,127 @@ class Level(Serializable):
             '_time_stop_idle': self.TIME_STOP_IDLE,
         }
 
-        w_width, w_height = pygame.display.get_window_size()
-
         # external factors:
         self.game_time_to_reset_factor = time_to_reset_factor
         self.game_time_reset_factor = 0
 
-        self._time_reset_screen = pygame.Surface((w_width, w_height))
-        self._time_reset_screen.fill((255, 255, 255))
-        self._time_reset_screen.set_alpha(0)
-
-        info_margin = 0.01
-        bar_margin = 5
-        bar_size = (self.BAR_WIDTH, 20)
-
-        self.time_stop_back_bar = pygame.Rect(
-            (w_width * info_margin, w_height * info_margin),
-            tuple(size + bar_margin * 2 for size in bar_size),
-        )
-        self.time_stop_bar = pygame.Rect(
-            (w_width * info_margin + bar_margin, w_height * info_margin + bar_margin),
-            bar_size,
-        )
+        compiled_level = self.compiled_level
+        self.walls = WallGrid(compiled_level.walls, compiled_level.rows, compiled_level.columns, cell_size=Block.SIZE)
+        self.spatial_index = SpatialGrid(cell_size=Block.SIZE)
+        self.navigation = NavigationField(self.walls)
+        self.engine = None  # updates the entities in batches, when enabled
 
-        # pre-update state:
-        self.active_entities = []
+        # pre-update state (dicts are used as ordered sets):
+        self.active_entities = {}
         self.coins = []
-        self.free_coins = []
+        self.free_coins = {}
         self.monsters = []
-        self.alive_monsters = []
+        self.alive_monsters = {}
+        self._deactivated_entities = []
 
         # post-update state:
         self.is_running = True
         self.is_complete = False
         self.is_time_stopped = False
+        self.is_time_stop_recharging = False
+        self.time_stop_charge = 1
 
         self.speed_factor = 1
         self.time_acceleration = 1
 
         self.has_win_condition = False
 
-        self.info_font = pygame.font.Font(None, 24)
-        self.coins_surface = None
-        self.refresh_stats_text()
+        self._view = None  # created on the first redraw, the simulation itself doesn't need a display
 
-    def reset(self):
-        self.player = None
+        self._journal_keys = []  # what the save journal has of every entity
 
+        self._spawn_state = None  # of the player and the entities as spawned, restarts restore it in place
+
+    def reset(self):
         for factor in self._time_stop_factors:
             setattr(self, factor, 0)
         self.game_time_reset_factor = 0
 
-        self._entities.clear()
-
-        for i, line in enumerate(self.level_map):
-            for j, el in enumerate(line):
-                location = pygame.Vector2(j * Block.SIZE, i * Block.SIZE)
-                if el in ("+", "v", "|", "="):
-                    direction = pygame.Vector2(el == "=", el in ("v", "|"))
-                    lava = Lava(location, direction, is_repeatable=el == "v")
-                    self._entities.append(lava)
-                elif el == "o":
-                    coin = Coin(location)
-                    self._entities.append(coin)
-                elif el == "@":
-                    self.player = Player(location)
-                    w_width, w_height = pygame.display.get_window_size()
-                    config.offset_x = self.player.rect.x - w_width // 2
-                    config.offset_y = self.player.rect.y - w_height // 2
-                elif el == "#":
-                    block = Block(location)
-                    self._entities.append(block)
-                elif el in ("m", "M"):
-                    monster = Monster(location, is_auto_target=el == "M")
-                    self._entities.append(monster)
-
-        self._pre_update_setup()
+        if self._spawn_state is not None and (self.engine is not None) == config.is_batched_update:
+            self._restore_spawn_state()
+        else:
+            self._spawn()
         self._post_update_setup()
 
-        self.time_stop_bar.width = self.BAR_WIDTH
-        self.refresh_stats_text()
+        self.time_stop_charge = 1
 
-    def update(self, time):
-        self._pre_update_setup()
+    def _spawn(self):
+        self.player = None
+        self._entities.clear()
 
-        self.player.update(time, level=self)
+        for el, column, row in self.compiled_level.spawns:
+            location = pygame.Vector2(column * Block.SIZE, row * Block.SIZE)
+            if el in ("+", "v", "|", "="):
+                direction = pygame.Vector2(el == "=", el in ("v", "|"))
+                lava = Lava(location, direction, is_repeatable=el == "v")
+                self._entities.append(lava)
+            elif el == "o":
+                coin = Coin(location)
+                self._entities.append(coin)
+            elif el in ("m", "M"):
+                monster = Monster(location, is_auto_target=el == "M")
+                self._entities.append(monster)
+        if self.compiled_level.player_spawn:
+            column, row = self.compiled_level.player_spawn
+            self.player = Player(pygame.Vector2(column * Block.SIZE, row * Block.SIZE))
+
+        self._setup_entities()
+
+        if self.engine:
+            entities_state = self.engine.get_state()
+        else:
+            entities_state = [(entity.rect.topleft, entity.to_record()) for entity in self._entities]
+        index_state = (
+            self.spatial_index.get_state(),
+            tuple(self.active_entities),
+            tuple(self.free_coins),
+            tuple(self.alive_monsters),
+        )
+        self._spawn_state = (self.player.rect.topleft, self.player.to_record()), entities_state, index_state
+
+    def _restore_spawn_state(self):
+        """Restart without rebuilding the level, the spawned state is copied back into the same entities."""
+        player_state, entities_state, index_state = self._spawn_state
+        self.player.respawn(*player_state)
+        if self.engine:
+            self.engine.set_state(entities_state)
+        else:
+            for entity, (position, record) in zip(self._entities, entities_state):
+                entity.respawn(position, record)
+
+        spatial_state, active_entities, free_coins, alive_monsters = index_state
+        self.spatial_index.set_state(spatial_state)
+        for collection, entities in (
+            (self.active_entities, active_entities),
+            (self.free_coins, free_coins),
+            (self.alive_monsters, alive_monsters),
+        ):
+            collection.clear()
+            collection.update(dict.fromkeys(entities))
+        self._deactivated_entities.clear()
 
-        w_width, w_height = pygame.display.get_window_size()
-        config.offset_x = self.player.rect.x - w_width // 2
-        config.offset_y = self.player.rect.y - w_height // 2
+    def update(self, time):
+        with profiler.measure("pre_update"):
+            self._pre_update_setup()
+
+        with profiler.measure("player"):
+            self.player.update(time, level=self)
+            self.navigation.update(self.player.rect)
 
-        for entity in self.active_entities:
-            entity.update(time, level=self)
+        with profiler.measure("entities"):
+            if self.engine:
+                self.engine.update(time, level=self)
+            else:
+                for entity in self.active_entities:
+                    entity.update(time, level=self)
+                    self.spatial_index.update(entity)
 
-        self.has_win_condition = not any(self.free_coins) and not any(self.alive_monsters)
+        self.has_win_condition = not self.free_coins and not self.alive_monsters
         if self.has_win_condition:
             self.player.set_won(level=self)
         elif self.player.is_alive:
@@ -138,42 +171,76 @@ class Level(Serializable):
         self._post_update_setup()
 
     def redraw(self, screen):
-        self.player.render(screen)
-        for entity in self.active_entities:
-            entity.render(screen)
-        if self.game_time_reset_factor > 0:
-            alpha = int(self.game_time_reset_factor * 255)
-            self._time_reset_screen.set_alpha(alpha)
-            screen.blit(self._time_reset_screen, (0, 0))
-        self._draw_infographics(screen)
+        """Draw the level, returns screen areas drawn over, except for the static terrain."""
+        with profiler.measure("redraw"):
+            if self._view is None:
+                self._view = LevelView(self, screen.get_size())
+            return self._view.redraw(screen)
+
+    def update_camera(self, window_size):
+        w_width, w_height = window_size
+        x, y = self.player.get_render_position()
+        config.offset_x = x - w_width // 2
+        config.offset_y = y - w_height // 2
 
     def _pre_update_setup(self):
-        for l in (
+        """Apply entity deactivations from the previous frame."""
+        if not self._deactivated_entities:
+            return
+
+        for entity in self._deactivated_entities:
+            self.active_entities.pop(entity, None)
+            self.free_coins.pop(entity, None)
+            self.alive_monsters.pop(entity, None)
+            if entity in self.spatial_index:
+                self.spatial_index.remove(entity)
+            if self.engine:
+                self.engine.deactivate(entity)
+        self._deactivated_entities.clear()
+
+    def _setup_entities(self):
+        if config.is_batched_update:  # the entities are replaced by views over the engine arrays
+            self.engine = engine.EntityEngine(self._entities, self.walls)
+            self._entities = self.engine.views
+        else:
+            self.engine = None
+
+        for collection in (
             self.active_entities,
             self.coins,
             self.free_coins,
             self.monsters,
             self.alive_monsters,
+            self._deactivated_entities,
         ):
-            l.clear()
+            collection.clear()
+        self.spatial_index.clear()
 
         for entity in self._entities:
             if entity.is_active:
-                self.active_entities.append(entity)
+                self.active_entities[entity] = None
+                self.spatial_index.insert(entity)
 
             if isinstance(entity, Coin):
                 self.coins.append(entity)
                 if entity.is_active:
-                    self.free_coins.append(entity)
+                    self.free_coins[entity] = None
             elif isinstance(entity, Monster):
                 self.monsters.append(entity)
                 if entity.is_active:
-                    self.alive_monsters.append(entity)
+                    self.alive_monsters[entity] = None
+
+    def on_coin_taken(self, coin):
+        self._deactivated_entities.append(coin)
+
+    def on_monster_died(self, monster):
+        self._deactivated_entities.append(monster)
 
     def _post_update_setup(self):
         self.is_running = not (self.player.is_dead or self.player.is_winner)
         self.is_complete = self.player.is_winner
         self.is_time_stopped = any(value > 0 for value in (self._time_stop_left, self._time_stop_freeze))
+        self.is_time_stop_recharging = self._time_stop_idle > 0
 
         if self.game_time_reset_factor <= 0:
             time_acceleration = 1
@@ -214,10 +281,9 @@ class Level(Serializable):
         if any(value > 0 for value in stop_factor_values):
             charge = sum(stop_factor_values)
             total_charge = sum((self.TIME_STOP, self.TIME_FREEZE))
-            self.time_stop_bar.width = int(self.BAR_WIDTH * (charge / total_charge))
+            self.time_stop_charge = charge / total_charge
         elif self._time_stop_idle > 0:
-            scale = (self.TIME_STOP_IDLE - self._time_stop_idle) / self.TIME_STOP_IDLE
-            self.time_stop_bar.width = int(self.BAR_WIDTH * scale)
+            self.time_stop_charge = (self.TIME_STOP_IDLE - self._time_stop_idle) / self.TIME_STOP_IDLE
 
         if self._time_stop_left > 0:
             color_factor = 0
@@ -231,58 +297,9 @@ class Level(Serializable):
             effects.Sound.TIME_STOP.stop()
             effects.Sound.WORLD_RESET.unpause()
 
-    def _draw_infographics(self, screen):
-        pygame.draw.rect(screen, "gray", self.time_stop_back_bar)
-        if any(value > 0 for value in (self._time_stop_left, self._time_stop_freeze)):
-            time_left_text_color = adjust_color((0, 255, 0))
-        elif self._time_stop_idle > 0:
-            time_left_text_color = (0, 125, 0)
-        else:
-            time_left_text_color = (0, 255, 0)
-        pygame.draw.rect(screen, time_left_text_color, self.time_stop_bar)
-
-        coins_text_margin = 10
-        coins_text_pos = (self.time_stop_back_bar.left, self.time_stop_back_bar.bottom + coins_text_margin)
-        screen.blit(self.coins_surface, coins_text_pos)
-
-        if self.game_time_to_reset_factor is not None:
-            time_left = self.game_time_to_reset_factor
-            if self.is_time_stopped:
-                time_left_text = "ZA WARUDO!"
-                time_left_text_color = "goldenrod"
-            elif time_left > 0:
-                time_left_text = f"Time left: {time_left // 1000}"
-                time_left_text_color = "black" if time_left >= self.WARNING_TIME else "red"
-            else:
-                time_left_text = "MADE IN HEAVEN!"
-                time_left_text_color = "blueviolet"
-            time_left_surface = self.info_font.render(
-                time_left_text, True, time_left_text_color, "white"
-            )
-            _, coin_bar_shift = self.coins_surface.get_size()
-            time_left_post = (
-                self.time_stop_back_bar.left,
-                self.time_stop_back_bar.bottom + coin_bar_shift + coins_text_margin,
-            )
-            screen.blit(time_left_surface, time_left_post)
-
-    def refresh_stats_text(self):
-        coins_number = len(self.coins)
-        collected_coins_number = coins_number - len(self.free_coins)
-        coins_text = f"Coins: {collected_coins_number} / {coins_number}"
-        if any(self.monsters):
-            monsters_number = len(self.monsters)
-            defeated_monsters_number = monsters_number - len(self.alive_monsters)
-            coins_text = f"{coins_text} | Monsters: {defeated_monsters_number} / {monsters_number}"
-        self.coins_surface = self.info_font.render(
-            coins_text, True, "black", "white"
-        )
-
     @staticmethod
     def load_level_maps():
-        levels_path = STATIC_DIR / "level_maps.json"
-        with levels_path.open("r") as f:
-            return json.load(f)
+        return list(compilation.get_compiled_levels().level_maps)
 
     @classmethod
     def to_internal_value(cls, data):
@@ -301,26 +318,19 @@ class Level(Serializable):
         obj = cls(level_map, number, is_final=is_final)
 
         obj.player = Player.to_internal_value(player_data) if player_data else None
-        entity_class_mapping = {
-            "lava": Lava,
-            "coin": Coin,
-            "block": Block,
-            "monster": Monster,
-        }
         obj._entities = [
-            (entity_class_mapping[data["type"]]).to_internal_value(data)
+            (cls.ENTITY_TYPES[data["type"]]).to_internal_value(data)
             for data in entities_data
+            if data["type"] != "block"  # walls are built from the level map, older saves still have them
         ]
 
         obj._time_stop_left = time_stop_left
         obj._time_stop_freeze = time_stop_freeze
         obj._time_stop_idle = time_stop_idle
 
-        obj._pre_update_setup()
+        obj._setup_entities()
         obj._post_update_setup()
 
-        obj.refresh_stats_text()
-
         return obj
 
     def to_representation(self):
@@ -335,3 +345,139 @@ class Level(Serializable):
             "_time_stop_freeze": self._time_stop_freeze,
             "_time_stop_idle": self._time_stop_idle,
         }
+
+    @classmethod
+    def from_binary(cls, data, level_maps, compiled_levels=None):
+        """
+        Read a level out of a binary save, see `to_binary`.
+        Every entity table is unpacked at once, then the entities are put back in their order by the type codes.
+        Raises `SaveFormatError` when the type codes and the tables don't add up to the data.
+        """
+        data = memoryview(data)
+        (
+            number,
+            entities_number,
+            is_final,
+            time_stop_left,
+            time_stop_freeze,
+            time_stop_idle,
+            has_player,
+        ) = cls.BINARY_HEADER.unpack_from(data)
+        offset = cls.BINARY_HEADER.size
+        if not 0 <= number < len(level_maps):
+            raise SaveFormatError(f"No level {number} in the level maps")
+
+        compiled_level = compiled_levels[number] if compiled_levels else None
+        obj = cls(level_maps[number], number, is_final=is_final, compiled_level=compiled_level)
+        if has_player:
+            obj.player = Player.from_record(Player.RECORD.unpack_from(data, offset))
+            offset += Player.RECORD.size
+
+        type_codes = bytes(data[offset:offset + entities_number])
+        offset += entities_number
+        if len(type_codes) != entities_number:
+            raise SaveFormatError("The entity type codes are cut short")
+        if type_codes and max(type_codes) >= len(cls.ENTITY_TYPES):
+            raise SaveFormatError(f"Unknown entity type code {max(type_codes)}")
+        sizes = [
+            type_codes.count(code) * entity_class.RECORD.size
+            for code, entity_class in enumerate(cls.ENTITY_TYPES.values())
+        ]
+        if offset + sum(sizes) != len(data):
+            raise SaveFormatError("The entity records don't match the type codes")
+        entity_tables = []
+        for size, entity_class in zip(sizes, cls.ENTITY_TYPES.values()):
+            records = entity_class.RECORD.iter_unpack(data[offset:offset + size])
+            entity_tables.append(map(entity_class.from_record, records))
+            offset += size
+        obj._entities = [next(entity_tables[code]) for code in type_codes]
+
+        obj._time_stop_left = time_stop_left
+        obj._time_stop_freeze = time_stop_freeze
+        obj._time_stop_idle = time_stop_idle
+
+        obj._setup_entities()
+        obj._post_update_setup()
+
+        return obj
+
+    def to_binary(self):
+        """
+        The header, the player record, a type code for every entity and then a table of records per entity type.
+        The level map isn't included, it's referenced by the level number.
+        """
+        return self.pack_binary_records(self.get_binary_records())
+
+    def get_binary_records(self):
+        """An immutable copy of what `to_binary` saves, it can be packed on another thread."""
+        header = (
+            self.number,
+            len(self._entities),
+            self.is_final,
+            self._time_stop_left,
+            self._time_stop_freeze,
+            self._time_stop_idle,
+            self.player is not None,
+        )
+        player_record = self.player.to_record() if self.player else None
+        entity_records = tuple((entity.TYPE, entity.to_record()) for entity in self._entities)
+        return header, player_record, entity_records
+
+    @classmethod
+    def pack_binary_records(cls, records):
+        header, player_record, entity_records = records
+        type_codes = {entity_type: code for code, entity_type in enumerate(cls.ENTITY_TYPES)}
+
+        chunks = [cls.BINARY_HEADER.pack(*header)]
+        if player_record is not None:
+            chunks.append(Player.RECORD.pack(*player_record))
+        chunks.append(bytes(type_codes[entity_type] for entity_type, _ in entity_records))
+        for entity_type, entity_class in cls.ENTITY_TYPES.items():
+            pack = entity_class.RECORD.pack
+            chunks.extend(pack(*record) for record_type, record in entity_records if record_type == entity_type)
+        return b"".join(chunks)
+
+    def to_journal_representation(self):
+        """The dynamic state for the save journal, with only the entities changed since the previous entry."""
+        entities_data = {}
+        for index, entity in enumerate(self._entities):
+            data = entity.to_representation()
+            key = self._get_journal_key(entity, data)
+            if key != self._journal_keys[index]:
+                self._journal_keys[index] = key
+                entities_data[index] = data
+        return {
+            "player": self.player.to_representation() if self.player else None,
+            "_entities": entities_data,
+            "_time_stop_left": self._time_stop_left,
+            "_time_stop_freeze": self._time_stop_freeze,
+            "_time_stop_idle": self._time_stop_idle,
+        }
+
+    def reset_journal(self, entities_data=None):
+        """Start the save journal over from the current state, e.g. once a snapshot of it is taken."""
+        if entities_data is None:
+            entities_data = [entity.to_representation() for entity in self._entities]
+        self._journal_keys = [
+            self._get_journal_key(entity, data) for entity, data in zip(self._entities, entities_data)
+        ]
+
+    def replay_journal(self, entries):
+        for data in entries:
+            player_data = data["player"]
+            self.player = Player.to_internal_value(player_data) if player_data else None
+            for index, entity_data in data["_entities"].items():
+                entity_class = self.ENTITY_TYPES[entity_data["type"]]
+                self._entities[int(index)] = entity_class.to_internal_value(entity_data)
+            for factor in self._time_stop_factors:
+                setattr(self, factor, data[factor])
+
+        self._setup_entities()
+        self._post_update_setup()
+        self.reset_journal()
+
+    @staticmethod
+    def _get_journal_key(entity, data):
+        if entity.JOURNAL_FIELDS is None:
+            return data
+        return tuple(data[field] for field in entity.JOURNAL_FIELDS)
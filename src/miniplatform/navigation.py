@@ -0,0 +1,50 @@
+import array
+import re
+
+_FREE_RUNS = re.compile(rb"\x00+")  # of a row of wall flags
+
+
+class NavigationField:
+    """
+    Where auto targeting monsters can chase the player from.
+    Monsters only walk along their row, so the free tiles of every row are cut into runs between walls
+    once per level. The runs the player can be reached along are only looked up again
+    when the player moves to another cell, a monster then checks its run in constant time.
+    """
+    REACH = 3  # rows above and below the player's feet
+
+    def __init__(self, walls):
+        self.cell_size = walls.cell_size
+        self.rows = walls.rows
+        self.columns = walls.columns
+        self.runs = array.array("i", [-1]) * (self.rows * self.columns)  # run ids of the tiles, -1 for walls
+        run = 0
+        cells = walls.cells
+        for row in range(self.rows):
+            offset = row * self.columns
+            for match in _FREE_RUNS.finditer(cells, offset, offset + self.columns):
+                start, end = match.span()
+                self.runs[start:end] = array.array("i", [run]) * (end - start)
+                run += 1
+
+        self.reachable_runs = frozenset()
+        self._player_cell = None
+
+    def update(self, player_rect):
+        size = self.cell_size
+        column, row = player_rect.centerx // size, (player_rect.bottom - 1) // size
+        if (column, row) == self._player_cell:
+            return
+        self._player_cell = (column, row)
+        runs = {self.get_run(column, row) for row in range(row - self.REACH, row + self.REACH + 1)}
+        runs.discard(-1)
+        self.reachable_runs = frozenset(runs)
+
+    def get_run(self, column, row):
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            return self.runs[row * self.columns + column]
+        return -1
+
+    def is_reachable(self, x, y):
+        """Whether the player can be reached walking from the point, along its row."""
+        return self.get_run(x // self.cell_size, y // self.cell_size) in self.reachable_runs
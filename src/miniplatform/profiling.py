@@ -0,0 +1,174 @@
+import collections
+import contextlib
+import cProfile
+import functools
+import logging
+import os
+import time
+
+import pygame
+
+from miniplatform.configs import VAR_DIR
+from miniplatform.assets import assets
+
+PHASES = (
+    "input",
+    "pre_update",
+    "player",
+    "entities",
+    "collision",
+    "redraw",
+    "post_processing",
+    "infographics",
+    "save_game",
+    "flip",
+)
+
+
+class FrameProfiler:
+    """
+    Opt-in timings of the frame phases, shown as an overlay next to the time stop bar.
+    Can also record a cProfile dump for a window of frames.
+    """
+    HISTORY = 120  # frames
+    REFRESH_FRAMES = 15
+    CAPTURE_FRAMES = 300
+
+    def __init__(self, is_instrumented=False, capture_window=None):
+        # collision handlers are called for every entity, they only get wrapped when instrumented from the start
+        self.is_instrumented = is_instrumented
+        self.is_enabled = is_instrumented
+
+        self._frame_timings = collections.defaultdict(float)
+        self._history = collections.defaultdict(lambda: collections.deque(maxlen=self.HISTORY))
+        self._frame_number = 0
+        self._frame_start = None
+
+        self._capture_window = capture_window
+        self._capture_profile = None
+        self._capture_end = None
+
+        self._font = None
+        self._overlay = None
+
+    def measure(self, phase):
+        if not self.is_enabled:
+            return contextlib.nullcontext()
+        return self._measure(phase)
+
+    @contextlib.contextmanager
+    def _measure(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._frame_timings[phase] += (time.perf_counter() - start) * 1000
+
+    def timed(self, phase):
+        """Decorate a function to add its time to the phase, left as is unless instrumented."""
+        def decorator(func):
+            if not self.is_instrumented:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.is_enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._frame_timings[phase] += (time.perf_counter() - start) * 1000
+
+            return wrapper
+
+        return decorator
+
+    def toggle(self):
+        self.is_enabled = not self.is_enabled
+        self._frame_timings.clear()
+        self._history.clear()
+        self._overlay = None
+        self._frame_start = None
+        logging.info("Frame profiler %s", "enabled" if self.is_enabled else "disabled")
+
+    def end_frame(self):
+        now = time.perf_counter()
+        if self.is_enabled:
+            if self._frame_start is not None:
+                self._history["frame"].append((now - self._frame_start) * 1000)
+            for phase in PHASES:
+                self._history[phase].append(self._frame_timings[phase])
+            self._frame_timings.clear()
+            if self._frame_number % self.REFRESH_FRAMES == 0:
+                self._overlay = None  # re-rendered on the next draw
+        self._frame_start = now
+        self._frame_number += 1
+        self._handle_capture()
+
+    def start_capture(self, frames=None):
+        if self._capture_profile is not None:
+            return
+        frames = frames or self.CAPTURE_FRAMES
+        logging.info("Profiling %s frames ...", frames)
+        self._capture_end = self._frame_number + frames
+        self._capture_profile = cProfile.Profile()
+        self._capture_profile.enable()
+
+    def _handle_capture(self):
+        if self._capture_window and self._frame_number == self._capture_window[0]:
+            self.start_capture(self._capture_window[1])
+        if self._capture_profile is not None and self._frame_number >= self._capture_end:
+            self._capture_profile.disable()
+            path = VAR_DIR / f"frames_{self._frame_number}.prof"
+            self._capture_profile.dump_stats(path)
+            logging.info("Frames profile saved to %s", path)
+            self._capture_profile = None
+
+    def render(self, screen, position):
+        if self._overlay is None:
+            self._overlay = self._render_overlay()
+        return screen.blit(self._overlay, position)
+
+    def _render_overlay(self):
+        if self._font is None:
+            self._font = assets.get_font(18)
+        rows = [("phase", "avg ms", "max ms")]
+        for phase in ("frame", *PHASES):
+            samples = self._history.get(phase)
+            if samples:
+                rows.append((phase, f"{sum(samples) / len(samples):.2f}", f"{max(samples):.2f}"))
+
+        line_height = self._font.get_linesize()
+        column_rights = (None, 130, 180)  # the name is left aligned, the numbers are right aligned
+        overlay = pygame.Surface((column_rights[-1] + 5, line_height * len(rows) + 5))
+        overlay.fill("white")
+        for i, row in enumerate(rows):
+            for value, right in zip(row, column_rights):
+                text = self._font.render(value, True, "black")
+                rect = text.get_rect(top=i * line_height + 3)
+                if right is None:
+                    rect.left = 5
+                else:
+                    rect.right = right
+                overlay.blit(text, rect)
+        return overlay
+
+
+def get_capture_window():
+    """Parse `MINI_PLATFORM_PROFILE_CAPTURE`, as "<first frame>:<number of frames>"."""
+    value = os.getenv("MINI_PLATFORM_PROFILE_CAPTURE")
+    if not value:
+        return None
+    try:
+        first_frame, frames = value.split(":")
+        return int(first_frame), int(frames)
+    except ValueError:
+        logging.warning("Ignoring MINI_PLATFORM_PROFILE_CAPTURE=%r, expected <first frame>:<number of frames>", value)
+        return None
+
+
+profiler = FrameProfiler(
+    is_instrumented=os.getenv("MINI_PLATFORM_PROFILE") == "1",
+    capture_window=get_capture_window(),
+)
@@ -0,0 +1,186 @@
+import pygame
+
+from miniplatform.assets import assets
+from miniplatform.configs import config
+from miniplatform.entities import Block
+from miniplatform.hud import text_cache
+from miniplatform.profiling import profiler
+from miniplatform.terrain import TerrainLayer
+
+
+class DirtyRectsRenderer:
+    """
+    Pushes only the changed screen areas to the display instead of flipping the whole window.
+    Falls back to a full redraw when the camera scrolls or the level changes.
+    """
+
+    def __init__(self, background):
+        self.background = background
+        self._dirty_rects = []
+        self._camera = None
+        self._level = None
+
+    def render(self, screen, game_session):
+        game_session.update_camera(screen)
+        camera = (config.offset_x, config.offset_y)
+        if camera != self._camera or game_session.level is not self._level:
+            screen.fill(self.background)
+            self._dirty_rects = game_session.render(screen)
+            with profiler.measure("flip"):
+                pygame.display.flip()
+        else:
+            for rect in self._dirty_rects:  # erase what's been drawn during the previous frame
+                screen.fill(self.background, rect)
+            dirty_rects = game_session.render(screen)
+            with profiler.measure("flip"):
+                pygame.display.update(self._dirty_rects + dirty_rects)
+            self._dirty_rects = dirty_rects
+        self._camera = camera
+        self._level = game_session.level
+
+
+class PostProcessing:
+    """
+    Effects over the drawn scene, under the HUD: the time stop desaturation and the time reset fade.
+    The background and the walls are gray already, so only the areas the entities were drawn to get desaturated,
+    the fade to white covers the whole frame.
+    """
+
+    def apply(self, screen, color_factor, fade, rects):
+        """Returns the changed areas."""
+        changed_rects = []
+        if color_factor < 1:
+            gray = assets.get_surface("desaturation", screen.get_size(), screen)
+            gray.set_alpha(round((1 - color_factor) * 255))
+            screen_rect = screen.get_rect()
+            for rect in _merge_rects(screen_rect.clip(rect) for rect in rects):  # every pixel is blended once
+                area = pygame.Rect((0, 0), rect.size)
+                pygame.transform.grayscale(screen.subsurface(rect), gray.subsurface(area))  # by the luminance
+                changed_rects.append(screen.blit(gray, rect, area))
+        if fade > 0:  # towards white
+            white = assets.get_surface("fade", screen.get_size(), screen)
+            white.fill((255, 255, 255))
+            white.set_alpha(round(fade * 255))
+            changed_rects.append(screen.blit(white, (0, 0)))
+        return changed_rects
+
+
+def _merge_rects(rects):
+    """
+    Disjoint rects covering the given ones, overlapping rects are merged into their union.
+    The unions may cover some background and walls too, they're gray and stay as they are.
+    """
+    merged = []
+    for rect in rects:
+        if not rect:
+            continue
+        rect = rect.copy()
+        i = rect.collidelist(merged)
+        while i != -1:  # a union may reach more rects
+            rect.union_ip(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+class LevelView:
+    """Presentation of a level: fonts, surfaces and the HUD live here, apart from the simulation."""
+    BAR_WIDTH = 100
+
+    VIEW_MARGIN = 1  # in tiles
+
+    WARNING_TIME = 30_000
+
+    def __init__(self, level, window_size):
+        self.level = level
+        w_width, w_height = window_size
+
+        # walls never change, the layer outlives level resets
+        self.terrain = TerrainLayer(level.walls, color=Block.COLOR)
+
+        self.post_processing = PostProcessing()
+
+        info_margin = 0.01
+        bar_margin = 5
+        bar_size = (self.BAR_WIDTH, 20)
+
+        self.time_stop_back_bar = pygame.Rect(
+            (w_width * info_margin, w_height * info_margin),
+            tuple(size + bar_margin * 2 for size in bar_size),
+        )
+        self.time_stop_bar = pygame.Rect(
+            (w_width * info_margin + bar_margin, w_height * info_margin + bar_margin),
+            bar_size,
+        )
+
+        self._stats = None
+        self._stats_text = None
+
+    def redraw(self, screen):
+        level = self.level
+        level.update_camera(screen.get_size())
+        self.terrain.render(screen)
+        dirty_rects = [level.player.render(screen)]
+        w_width, w_height = screen.get_size()
+        view = pygame.Rect(config.offset_x, config.offset_y, w_width, w_height)
+        for entity in level.spatial_index.query(view, margin=self.VIEW_MARGIN):  # only what's on the screen
+            dirty_rects.append(entity.render(screen))
+        with profiler.measure("post_processing"):
+            dirty_rects.extend(self.post_processing.apply(
+                screen, config.color_factor, min(level.game_time_reset_factor, 1), dirty_rects,
+            ))
+        with profiler.measure("infographics"):
+            dirty_rects.extend(self._draw_infographics(screen))
+        if profiler.is_enabled:
+            overlay_position = (self.time_stop_back_bar.right + 10, self.time_stop_back_bar.top)
+            dirty_rects.append(profiler.render(screen, overlay_position))
+        return dirty_rects
+
+    def _draw_infographics(self, screen):
+        level = self.level
+        dirty_rects = [pygame.draw.rect(screen, "gray", self.time_stop_back_bar)]
+        if level.is_time_stop_recharging:
+            time_left_text_color = (0, 125, 0)
+        else:
+            time_left_text_color = (0, 255, 0)
+        self.time_stop_bar.width = int(self.BAR_WIDTH * level.time_stop_charge)
+        pygame.draw.rect(screen, time_left_text_color, self.time_stop_bar)
+
+        self._refresh_stats_text()
+        coins_text_margin = 10
+        coins_text_pos = (self.time_stop_back_bar.left, self.time_stop_back_bar.bottom + coins_text_margin)
+        coins_rect = text_cache.draw(screen, coins_text_pos, self._stats_text, "black", "white")
+        dirty_rects.append(coins_rect)
+
+        if level.game_time_to_reset_factor is not None:
+            time_left = level.game_time_to_reset_factor
+            if level.is_time_stopped:
+                time_left_text = "ZA WARUDO!"
+                time_left_text_color = "goldenrod"
+            elif time_left > 0:
+                time_left_text = f"Time left: {int(time_left // 1000)}"
+                time_left_text_color = "black" if time_left >= self.WARNING_TIME else "red"
+            else:
+                time_left_text = "MADE IN HEAVEN!"
+                time_left_text_color = "blueviolet"
+            time_left_post = (
+                self.time_stop_back_bar.left,
+                self.time_stop_back_bar.bottom + coins_rect.height + coins_text_margin,
+            )
+            dirty_rects.append(text_cache.draw(screen, time_left_post, time_left_text, time_left_text_color, "white"))
+        return dirty_rects
+
+    def _refresh_stats_text(self):
+        level = self.level
+        stats = (len(level.coins), len(level.free_coins), len(level.monsters), len(level.alive_monsters))
+        if stats == self._stats:  # re-render only when a counter changes
+            return
+        self._stats = stats
+
+        coins_number, free_coins_number, monsters_number, alive_monsters_number = stats
+        collected_coins_number = coins_number - free_coins_number
+        coins_text = f"Coins: {collected_coins_number} / {coins_number}"
+        if monsters_number:
+            defeated_monsters_number = monsters_number - alive_monsters_number
+            coins_text = f"{coins_text} | Monsters: {defeated_monsters_number} / {monsters_number}"
+        self._stats_text = coins_text
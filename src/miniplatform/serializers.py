@@ -1,8 +1,10 @@
 import abc
 import json
+import os
 
 
 class Serializable(abc.ABC):
+    __slots__ = ()
 
     @classmethod
     @abc.abstractmethod
@@ -16,3 +18,13 @@ class Serializable(abc.ABC):
     def json(self):
         value = self.to_representation()
         return json.dumps(value)
+
+
+def write_atomically(file, data):
+    """Write to a temporary file first, a crash never leaves the file cut short."""
+    temp_file = file.with_name(f"{file.name}.tmp")
+    with temp_file.open(mode="wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, file)
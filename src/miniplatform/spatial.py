@@ -0,0 +1,218 @@
+import collections
+import itertools
+
+import pygame
+
+WALL_TILE = "#"
+
+_WALL_TABLE = bytes(int(chr(code) == WALL_TILE) for code in range(256))  # maps a map row to wall flags
+
+
+class SpatialGrid:
+    """
+    A uniform grid used as a collision broadphase.
+    Entities get bucketed into every cell their rect overlaps,
+    so collision handlers only test nearby candidates instead of every entity.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._cells = collections.defaultdict(set)
+        self._entity_cells = {}
+        self._order = {}
+        self._counter = itertools.count()
+        self._changed = set()  # entities inserted, moved or removed since the last `get_state`
+
+    def __contains__(self, entity):
+        return entity in self._entity_cells
+
+    def clear(self):
+        self._changed.update(self._entity_cells)
+        self._cells.clear()
+        self._entity_cells.clear()
+        self._order.clear()
+        self._counter = itertools.count()
+
+    def get_state(self):
+        """A copy of the entity cells and the insertion order, to restore with `set_state`."""
+        self._changed.clear()
+        counter = max(self._order.values(), default=-1) + 1
+        return dict(self._entity_cells), dict(self._order), counter
+
+    def set_state(self, state):
+        """
+        Go back to the state of the last `get_state`. Only the entities changed since are put back in their cells,
+        the buckets of the rest are left as they are.
+        """
+        entity_cells, order, counter = state
+        for entity in self._changed:
+            cells = self._entity_cells.pop(entity, ())
+            saved_cells = entity_cells.get(entity, ())
+            for cell in cells:
+                if cell not in saved_cells:
+                    self._discard(cell, entity)
+            if entity in order:
+                for cell in saved_cells:
+                    self._cells[cell].add(entity)
+                self._entity_cells[entity] = saved_cells
+                self._order[entity] = order[entity]
+            else:
+                self._order.pop(entity, None)
+        self._changed.clear()
+        self._counter = itertools.count(counter)
+
+    def insert(self, entity):
+        cells = self._get_cells(entity.rect)
+        for cell in cells:
+            self._cells[cell].add(entity)
+        self._entity_cells[entity] = cells
+        self._order[entity] = next(self._counter)
+        self._changed.add(entity)
+
+    def remove(self, entity):
+        cells = self._entity_cells.pop(entity)
+        for cell in cells:
+            self._discard(cell, entity)
+        del self._order[entity]
+        self._changed.add(entity)
+
+    def update(self, entity):
+        old_cells = self._entity_cells[entity]
+        cells = self._get_cells(entity.rect)
+        if cells == old_cells:
+            return
+        for cell in old_cells:
+            if cell not in cells:
+                self._discard(cell, entity)
+        for cell in cells:
+            self._cells[cell].add(entity)
+        self._entity_cells[entity] = cells
+        self._changed.add(entity)
+
+    def query(self, rect, margin=1):
+        """
+        Return entities bucketed around the rect, in their insertion order.
+        The margin (in cells) keeps candidates available while a collision handler pushes the rect around.
+        """
+        candidates = set()
+        cells = self._cells
+        left, right, top, bottom = self._get_bounds(rect, margin)
+        if (right - left + 1) * (bottom - top + 1) > len(cells):  # a big rect, like the view, over a sparse grid
+            for (x, y), bucket in cells.items():
+                if left <= x <= right and top <= y <= bottom:
+                    candidates.update(bucket)
+        else:
+            for x in range(left, right + 1):
+                for y in range(top, bottom + 1):
+                    if (x, y) in cells:
+                        candidates.update(cells[x, y])
+        return sorted(candidates, key=self._order.__getitem__)
+
+    def _get_bounds(self, rect, margin=0):
+        """The first and the last column and row of the cells the rect overlaps."""
+        size = self.cell_size
+        return (
+            rect.left // size - margin,
+            (rect.right - 1) // size + margin,
+            rect.top // size - margin,
+            (rect.bottom - 1) // size + margin,
+        )
+
+    def _get_cells(self, rect, margin=0):
+        left, right, top, bottom = self._get_bounds(rect, margin)
+        return tuple(
+            (x, y)
+            for x in range(left, right + 1)
+            for y in range(top, bottom + 1)
+        )
+
+    def _discard(self, cell, entity):
+        bucket = self._cells[cell]
+        bucket.discard(entity)
+        if not bucket:
+            del self._cells[cell]
+
+
+class WallGrid:
+    """
+    A compact occupancy grid of the level walls, one byte per tile.
+    Wall lookups only touch the cells a rect overlaps, regardless of how many walls the level has.
+    """
+
+    def __init__(self, cells, rows, columns, cell_size):
+        self.cell_size = cell_size
+        self.rows = rows
+        self.columns = columns
+        self._cells = bytearray(cells)
+
+    @property
+    def cells(self):
+        """Row by row wall flags, a byte per tile."""
+        return self._cells
+
+    def is_wall(self, column, row):
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            return self._cells[row * self.columns + column] == 1
+        return False
+
+    def get_rects(self, rect, margin=0):
+        """Yield rects of the walls within the cells the rect overlaps and the margin (in cells) around, row by row."""
+        size = self.cell_size
+        left = max(rect.left // size - margin, 0)
+        right = min((rect.right - 1) // size + margin, self.columns - 1)
+        top = max(rect.top // size - margin, 0)
+        bottom = min((rect.bottom - 1) // size + margin, self.rows - 1)
+        cells = self._cells
+        for row in range(top, bottom + 1):
+            offset = row * self.columns
+            for column in range(left, right + 1):
+                if cells[offset + column]:
+                    yield pygame.Rect(column * size, row * size, size, size)
+
+    def get_colliding_rects(self, rect):
+        """
+        Yield walls colliding with the rect.
+        The check is lazy, so a caller may resolve the collision (move the rect) before getting the next wall.
+        """
+        for wall in self.get_rects(rect):
+            if rect.colliderect(wall):
+                yield wall
+
+    def sweep(self, rect, dx, dy):
+        """
+        Cut an integer move of the rect short where the rect runs into its first wall, a pixel into it,
+        so the usual collision handling resolves it as if the move was short; the whole move if the way is clear.
+        The rect is swept along x first, then along y, over every cell column or row it passes,
+        so no wall is skipped however far it moves.
+        """
+        if dx:
+            dx = self._sweep_axis(rect.left, rect.right, rect.top, rect.bottom, dx, is_horizontal=True)
+        if dy:
+            left = rect.left + dx
+            dy = self._sweep_axis(rect.top, rect.bottom, left, left + rect.width, dy, is_horizontal=False)
+        return dx, dy
+
+    def _sweep_axis(self, start, end, cross_start, cross_end, delta, is_horizontal):
+        size = self.cell_size
+        lines = self.columns if is_horizontal else self.rows
+        first, last = cross_start // size, (cross_end - 1) // size
+        if delta > 0:
+            passed = range(max((end - 1) // size + 1, 0), min((end - 1 + delta) // size, lines - 1) + 1)
+        else:
+            passed = range(min(start // size - 1, lines - 1), max((start + delta) // size, 0) - 1, -1)
+        for line in passed:
+            for cross in range(first, last + 1):
+                if self.is_wall(*((line, cross) if is_horizontal else (cross, line))):
+                    return line * size + 1 - end if delta > 0 else (line + 1) * size - 1 - start
+        return delta
+
+
+def parse_walls(level_map):
+    """Wall flags of a level map, a byte per tile row by row, along with the number of rows and columns."""
+    rows = len(level_map)
+    columns = max((len(line) for line in level_map), default=0)
+    cells = bytearray(rows * columns)
+    for i, line in enumerate(level_map):
+        offset = i * columns
+        cells[offset:offset + len(line)] = line.encode().translate(_WALL_TABLE)
+    return bytes(cells), rows, columns
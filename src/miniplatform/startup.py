@@ -0,0 +1,98 @@
+import concurrent.futures
+import contextlib
+import logging
+import threading
+import time
+
+import pygame
+
+from miniplatform import compilation, effects
+from miniplatform.assets import assets
+from miniplatform.game import Game
+from miniplatform.hud import text_cache
+
+
+class StartupPipeline:
+    """
+    Gets the game to its first frame in stages: the window shows up first,
+    the audio, the level maps and the save file are loaded concurrently in the background meanwhile,
+    and the game is set up as soon as the level maps and the save are there.
+    The game itself is set up on the main thread, `configs.config` is thread local.
+    Without a levels cache, only the level the game starts on is compiled before the first frame,
+    the rest are compiled in the background after it.
+    """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._stages = {}  # name: start and end, in ms since the startup
+        self._levels_loading = None
+        self._save_loading = None
+        self._compiling_thread = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = self._get_time()
+        try:
+            yield
+        finally:
+            self._stages[name] = (start, self._get_time())
+
+    def show_window(self, window_size):
+        with self.stage("window"):
+            screen = pygame.display.set_mode(window_size)
+            pygame.display.set_caption("Mini platform")
+            screen.fill((255, 255, 255))
+            loading_text = text_cache.render("Loading ...", "black", font_size=48)
+            screen.blit(loading_text, loading_text.get_rect(center=screen.get_rect().center))
+            pygame.display.flip()
+        return screen
+
+    def start_loading(self):
+        effects.preload_audio()  # on a thread of its own
+        executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="Startup")
+        self._levels_loading = executor.submit(self._run_stage, "levels", compilation.get_compiled_levels)
+        self._save_loading = executor.submit(self._run_stage, "save", Game.read_saved_game)
+        executor.shutdown(wait=False)  # the threads finish with the loading
+
+    def wait_for_loading(self, timeout):
+        """Returns whether the game can be set up."""
+        _, not_done = concurrent.futures.wait((self._levels_loading, self._save_loading), timeout=timeout)
+        return not not_done
+
+    def get_game(self, is_journaling):
+        self._levels_loading.result()  # raises what went wrong in the background
+        saved_game = self._save_loading.result()
+        with self.stage("game"):
+            game = Game.load_game(is_journaling=is_journaling, saved_game=saved_game)
+        self._compile_levels(game.compiled_levels)
+        return game
+
+    def _compile_levels(self, compiled_levels):
+        if compiled_levels is None or compiled_levels.is_complete():
+            return
+        self._compiling_thread = threading.Thread(
+            target=self._run_stage,
+            args=("compiling", compiled_levels.compile_all),
+            name="LevelCompiler",
+            daemon=True,
+        )
+        self._compiling_thread.start()
+
+    def report(self):
+        """Log the time to the first frame, by stage."""
+        first_frame = self._get_time()
+        stages = [f"{name} {end - start:.1f} ms (at {start:.1f})" for name, (start, end) in self._stages.items()]
+        if assets.loading_time is not None:
+            stages.append(f"audio {assets.loading_time:.1f} ms (in the background)")
+        elif assets.is_loading():
+            stages.append("audio still loading")
+        if self._compiling_thread is not None and self._compiling_thread.is_alive():
+            stages.append("other levels still compiling")
+        logging.info("First frame in %.1f ms: %s", first_frame, ", ".join(stages))
+
+    def _run_stage(self, name, func):
+        with self.stage(name):
+            return func()
+
+    def _get_time(self):
+        return (time.perf_counter() - self._start) * 1000
@@ -0,0 +1,57 @@
+import pygame
+
+from miniplatform.configs import config
+
+
+class TerrainLayer:
+    """
+    Static terrain pre-rendered into chunk surfaces.
+    Walls never move nor change colour, so a frame only blits the chunks under the camera.
+    """
+    CHUNK_TILES = 16
+
+    _COLOR_KEY = (255, 0, 255)
+    _KEY_INDEX, _WALL_INDEX = range(2)
+
+    def __init__(self, walls, color):
+        self.chunk_size = walls.cell_size * self.CHUNK_TILES
+        self._chunks = {}
+
+        palette = [self._COLOR_KEY, color]
+        columns = -(-walls.columns // self.CHUNK_TILES)
+        rows = -(-walls.rows // self.CHUNK_TILES)
+        for chunk_y in range(rows):
+            for chunk_x in range(columns):
+                area = pygame.Rect(
+                    chunk_x * self.chunk_size,
+                    chunk_y * self.chunk_size,
+                    self.chunk_size,
+                    self.chunk_size,
+                )
+                wall_rects = list(walls.get_rects(area))
+                if not wall_rects:
+                    continue
+                # 8-bit surfaces: a byte per pixel keeps big maps affordable
+                chunk = pygame.Surface(area.size, depth=8)
+                chunk.set_palette(palette)
+                chunk.fill(self._KEY_INDEX)
+                chunk.set_colorkey(self._KEY_INDEX, pygame.RLEACCEL)
+                for wall in wall_rects:
+                    wall.move_ip(-area.x, -area.y)
+                    chunk.fill(self._WALL_INDEX, wall)
+                self._chunks[chunk_x, chunk_y] = chunk
+
+    def render(self, screen):
+        w_width, w_height = screen.get_size()
+        size = self.chunk_size
+        offset_x, offset_y = config.offset_x, config.offset_y
+        chunks = self._chunks
+        screen.blits(
+            (
+                (chunks[chunk_x, chunk_y], (chunk_x * size - offset_x, chunk_y * size - offset_y))
+                for chunk_y in range(offset_y // size, (offset_y + w_height - 1) // size + 1)
+                for chunk_x in range(offset_x // size, (offset_x + w_width - 1) // size + 1)
+                if (chunk_x, chunk_y) in chunks
+            ),
+            doreturn=False,
+        )